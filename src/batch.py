@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Localfluence - Batch Business to VEO3 Prompt Generator
+
+This module provides the entry point for running the pipeline over many
+businesses using sharded worker processes and a shared work queue.
+
+Usage:
+    python batch.py enqueue businesses.csv
+    python batch.py refresh roster.csv
+    python batch.py run --processes 8
+    python batch.py status
+    python batch.py export --results-dir data/results
+
+Author: Localfluence Team
+"""
+
+import sys
+import os
+import csv
+from typing import Optional, Dict, Any, List, Tuple
+
+# Add the project root to Python path for absolute imports
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.config import validate_configuration
+from src.utils.argument_parser import parse_batch_arguments
+from src.utils.batch_executor import run_sharded
+from src.utils.refresh_scheduler import RefreshStore, enqueue_refresh
+from src.utils.result_store import BlobStore, ResultSink, flatten_result
+from src.utils.work_queue import WorkQueue
+
+
+def read_roster(csv_file: str) -> List[Tuple[str, str]]:
+    """
+    Read businesses from a CSV file.
+
+    Args:
+        csv_file: CSV file with business_name and address columns
+
+    Returns:
+        (business_name, address) pairs, skipping incomplete rows
+    """
+    roster = []
+    with open(csv_file, newline="") as f:
+        for row in csv.DictReader(f):
+            if not row.get("business_name") or not row.get("address"):
+                print(f"Skipping incomplete row: {row}")
+                continue
+            roster.append((row["business_name"], row["address"]))
+    return roster
+
+
+def print_status(queue: WorkQueue) -> None:
+    """Print job counts and the workers that have reported in, with their rate controller metrics."""
+    print("Jobs:")
+    for status, count in sorted(queue.stats().items()):
+        print(f"  {status}: {count}")
+
+    print("Workers:")
+    for worker in queue.workers():
+        print(f"  {worker['worker_id']} (last heartbeat {worker['last_heartbeat']:.0f})")
+        for service, metrics in worker["metrics"].get("services", {}).items():
+            print(
+                f"    {service}: window={metrics['window']} in_flight={metrics['in_flight']} "
+                f"latency={metrics['latency']} error_rate={metrics['error_rate']} "
+                f"throttled={metrics['throttled']}"
+            )
+        for route, metrics in worker["metrics"].get("models", {}).items():
+            print(f"    model {route}: " + " ".join(f"{key}={value}" for key, value in metrics.items()))
+
+
+def export_results(queue: WorkQueue, results_dir: str) -> int:
+    """
+    Stream every stored result into Parquet files.
+
+    Use this to rebuild the Parquet files from the queue database, e.g. after
+    a worker died before finishing its last part file.
+
+    Args:
+        queue: Queue whose results to export
+        results_dir: Directory for the Parquet files and blobs
+
+    Returns:
+        Number of results exported
+    """
+    blobs = BlobStore(os.path.join(results_dir, "blobs"))
+    count = 0
+    with ResultSink(os.path.join(results_dir, "parquet"), prefix="export") as sink:
+        for stored in queue.results():
+            result = stored["result"]
+            job = {
+                "id": stored["job_id"],
+                "business_name": stored["business_name"],
+                "address": stored["address"],
+                "options": {"refresh": "stagesRun" in result},
+            }
+            sink.write(flatten_result(job, stored["worker_id"], result, blobs, stored["completed_at"]))
+            count += 1
+    return count
+
+
+def main() -> Optional[Dict[str, Any]]:
+    """
+    Main function for the batch runner
+    """
+    args = parse_batch_arguments()
+    if not args:
+        print("Invalid arguments provided.")
+        return None
+
+    queue = WorkQueue(args["db"], local_only=args["local_only"])
+
+    if args["command"] == "enqueue":
+        roster = read_roster(args["csv_file"])
+        for business_name, address in roster:
+            queue.enqueue(business_name, address)
+        print(f"Enqueued {len(roster)} businesses")
+        return queue.stats()
+
+    if args["command"] == "refresh":
+        count = enqueue_refresh(queue, RefreshStore(args["db"]), read_roster(args["csv_file"]))
+        print(f"Enqueued {count} refreshes")
+        return queue.stats()
+
+    if args["command"] == "status":
+        print_status(queue)
+        return queue.stats()
+
+    if args["command"] == "export":
+        count = export_results(queue, args["results_dir"])
+        print(f"Exported {count} results to {args['results_dir']}")
+        return queue.stats()
+
+    if not validate_configuration():
+        return None
+
+    stats = run_sharded(
+        args["db"],
+        processes=args["processes"],
+        local_only=args["local_only"],
+        concurrency=args["concurrency"],
+        lease_seconds=args["lease_seconds"],
+        max_attempts=args["max_attempts"],
+        results_dir=args["results_dir"],
+    )
+    print_status(queue)
+    return stats
+
+
+if __name__ == "__main__":
+    result = main()
+    if result is None:
+        sys.exit(1)
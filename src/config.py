@@ -21,6 +21,14 @@ GOOGLE_API_KEY: Optional[str] = os.getenv("GOOGLE_PLACES_API_KEY")
 GROQ_API_KEY: Optional[str] = os.getenv("GROQ_API_KEY")
 OPENAI_API_KEY: Optional[str] = os.getenv("OPENAI_API_KEY")
 
+# LLM endpoints. Point these at local OpenAI-compatible stubs for testing.
+OPENAI_BASE_URL: Optional[str] = os.getenv("OPENAI_BASE_URL")
+GROQ_BASE_URL: str = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+
+# Local index of resolved places used to skip Find Place lookups.
+# Set PLACE_INDEX_PATH to an empty string to disable it.
+PLACE_INDEX_PATH: str = os.getenv("PLACE_INDEX_PATH", "data/place_index.db")
+
 
 def validate_configuration() -> bool:
     """
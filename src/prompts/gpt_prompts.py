@@ -22,8 +22,10 @@ def load_prompts() -> Dict[str, Any]:
 # Load prompts from JSON
 PROMPTS_DATA = load_prompts()
 
+# Model routes per task, in order of preference (see src/utils/model_router.py)
+MODEL_ROUTES = PROMPTS_DATA["model_routes"]
+
 # GPT Model Settings
-GPT_MODEL = PROMPTS_DATA["gpt_settings"]["model"]
 GPT_TEMPERATURE = PROMPTS_DATA["gpt_settings"]["temperature"]
 
 # Stage 1 Prompt - Creative Brief to Cinematic Prompt
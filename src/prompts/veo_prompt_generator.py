@@ -1,8 +1,8 @@
-from openai import OpenAI
-import os
-from src.config import get_openai_api_key
+import asyncio
+import json
+from typing import Any, Dict
+from src.utils.model_router import get_model_router, get_route_client
 from src.prompts.gpt_prompts import (
-    GPT_MODEL, 
     GPT_TEMPERATURE,
     STAGE1_SYSTEM_PROMPT,
     STAGE2_SYSTEM_PROMPT,
@@ -10,40 +10,38 @@ from src.prompts.gpt_prompts import (
     get_stage2_user_prompt
 )
 
-import openai
 
-def veo_prompt_stage1(creative_brief):
-    client = OpenAI(api_key=get_openai_api_key())
+async def _chat_completion(route: Dict[str, Any], system_prompt: str, user_prompt: str) -> str:
+    response = await get_route_client(route).chat.completions.create(
+        model=route["model"],
+        temperature=GPT_TEMPERATURE,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+    )
+    return response.choices[0].message.content
 
-    response = client.chat.completions.create(
-            model=GPT_MODEL,
-            messages=[
-                {"role": "system", "content": STAGE1_SYSTEM_PROMPT},
-                {"role": "user", "content": get_stage1_user_prompt(creative_brief)}
-            ],
-            temperature=GPT_TEMPERATURE
-        )
 
-    return response.choices[0].message.content
+async def generate(system_prompt: str, user_prompt: str) -> str:
+    """Run a generation prompt through the model router (hedged, with failover)."""
+    _, reply = await get_model_router().call(
+        "generation",
+        len(system_prompt) + len(user_prompt),
+        lambda route: _chat_completion(route, system_prompt, user_prompt),
+    )
+    return reply
 
 
-def veo_prompt_stage2(creative_brief: str) -> dict:
-    client = OpenAI(api_key=get_openai_api_key())
+async def veo_prompt_stage1_async(creative_brief) -> str:
+    return await generate(STAGE1_SYSTEM_PROMPT, get_stage1_user_prompt(creative_brief))
 
-    response = client.chat.completions.create(
-        model=GPT_MODEL,
-        temperature=GPT_TEMPERATURE,
-        messages=[
-            {"role": "system", "content": STAGE2_SYSTEM_PROMPT},
-            {"role": "user", "content": get_stage2_user_prompt(creative_brief)}
-        ]
-    )
 
-    # Extract and parse response
-    reply = response.choices[0].message.content
+async def veo_prompt_stage2_async(creative_brief: str) -> dict:
+    reply = await generate(STAGE2_SYSTEM_PROMPT, get_stage2_user_prompt(creative_brief))
 
+    # Extract and parse response
     try:
-        import json
         return json.loads(reply)
     except json.JSONDecodeError:
         # If it's not valid JSON (e.g., Markdown code block), try cleaning
@@ -54,3 +52,10 @@ def veo_prompt_stage2(creative_brief: str) -> dict:
             # Raise an exception if JSON parsing fails
             raise ValueError(f"Failed to parse JSON response from GPT API. Response: {reply}")
 
+
+def veo_prompt_stage1(creative_brief):
+    return asyncio.run(veo_prompt_stage1_async(creative_brief))
+
+
+def veo_prompt_stage2(creative_brief: str) -> dict:
+    return asyncio.run(veo_prompt_stage2_async(creative_brief))
@@ -42,4 +42,58 @@ def parse_and_validate_arguments() -> Optional[Dict[str, Any]]:
         
     except Exception as e:
         print(f"Error parsing arguments: {e}")
-        return None 
\ No newline at end of file
+        return None 
+
+def parse_batch_arguments() -> Optional[Dict[str, Any]]:
+    """Parse command line arguments for the batch runner, returning them as a dictionary."""
+    try:
+        parser = argparse.ArgumentParser(
+            description="Localfluence - Sharded batch VEO3 prompt generation",
+            formatter_class=argparse.RawDescriptionHelpFormatter,
+            epilog="""
+        Examples:
+        python batch.py enqueue businesses.csv
+        python batch.py refresh roster.csv
+        python batch.py run --processes 8 --concurrency 4
+        python batch.py status
+        python batch.py export --results-dir data/results
+            """
+        )
+        parser.add_argument("--db", default="data/localfluence.db", help="Path to the shared queue database")
+        parser.add_argument(
+            "--local-only",
+            action="store_true",
+            help="Use WAL journaling for the queue database; only when every worker runs on this host",
+        )
+
+        subparsers = parser.add_subparsers(dest="command", required=True)
+
+        enqueue_parser = subparsers.add_parser("enqueue", help="Add businesses from a CSV file to the queue")
+        enqueue_parser.add_argument("csv_file", help="CSV file with business_name and address columns")
+
+        refresh_parser = subparsers.add_parser("refresh", help="Queue incremental refreshes for a roster, most stale first")
+        refresh_parser.add_argument("csv_file", help="CSV file with business_name and address columns")
+
+        run_parser = subparsers.add_parser("run", help="Process the queue until it is drained")
+        run_parser.add_argument("--processes", type=int, default=None, help="Worker processes on this host (default: CPU count)")
+        run_parser.add_argument("--concurrency", type=int, default=4, help="Businesses processed concurrently per worker")
+        run_parser.add_argument("--lease-seconds", type=float, default=300.0, help="Lease length before a job is re-queued")
+        run_parser.add_argument("--max-attempts", type=int, default=3, help="Attempts before a job is marked as failed")
+        run_parser.add_argument("--results-dir", default=None, help="Also stream results to Parquet files in this directory")
+
+        export_parser = subparsers.add_parser("export", help="Write the stored results to Parquet files")
+        export_parser.add_argument("--results-dir", required=True, help="Directory for the Parquet files and blobs")
+
+        subparsers.add_parser("status", help="Show queue and worker status")
+
+        args = parser.parse_args()
+
+        if args.command == "run" and (args.concurrency < 1 or (args.processes is not None and args.processes < 1)):
+            print("--processes and --concurrency must be at least 1")
+            return None
+
+        return vars(args)
+
+    except Exception as e:
+        print(f"Error parsing arguments: {e}")
+        return None
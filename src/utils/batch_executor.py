@@ -0,0 +1,286 @@
+"""
+Batch Executor Module
+
+This module runs the Localfluence pipeline for many businesses at once. Work
+is sharded across worker processes that pull jobs from a shared WorkQueue;
+each process runs its own asyncio loop and browser, and processes several
+businesses concurrently. Workers on other hosts can join by pointing at the
+same queue database in a shared directory.
+
+Author: Localfluence Team
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+
+from src.utils.model_router import get_model_router
+from src.utils.rate_controller import (
+    DEFAULT_LIMITS,
+    configure_scheduler,
+    get_scheduler,
+    oversubscribed_services,
+    split_limits,
+)
+from src.utils.refresh_scheduler import RefreshStore, refresh_business
+from src.utils.result_store import BlobStore, ResultSink, flatten_result, slim_result
+from src.utils.work_queue import WorkQueue, make_worker_id
+
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_LEASE_SECONDS = 300.0
+DEFAULT_HEARTBEAT_SECONDS = 30.0
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_POLL_SECONDS = 5.0
+
+
+async def run_pipeline_job(job: Dict[str, Any], crawler: Any) -> Dict[str, Any]:
+    """
+    Run the full pipeline for a single queued business.
+
+    Args:
+        job: Job leased from the WorkQueue
+        crawler: Started AsyncWebCrawler shared by the worker process
+
+    Returns:
+        JSON-serializable result with the stage outputs and per-stage timings
+
+    Raises:
+        RuntimeError: If the website scrape failed, so the job is retried
+    """
+    # Imported here so that queue management (enqueue, status) does not need
+    # API keys or a browser installation.
+    from src.utils.google_maps_scraper import find_one_business
+    from src.utils.website_scraper import NO_WEBSITE_ERROR, scrape_business_website_ai
+    from src.prompts.veo_prompt_generator import veo_prompt_stage1_async, veo_prompt_stage2_async
+
+    business_name = job["business_name"]
+    address = job["address"]
+    timings: Dict[str, float] = {}
+
+    start = time.perf_counter()
+    business = await asyncio.to_thread(find_one_business, business_name, address)
+    timings["places"] = time.perf_counter() - start
+
+    if not business:
+        return {"businessInfo": None, "error": "Business not found", "timings": timings}
+
+    start = time.perf_counter()
+    website_scraped_info = await scrape_business_website_ai(
+        business_name, address, "ai_video", business=business, crawler=crawler
+    )
+    timings["scrape"] = time.perf_counter() - start
+
+    # The scraper reports crawl and model failures in its result rather than
+    # raising; raise them so the queue retries the job instead of generating
+    # prompts from the error.
+    scrape_error = (website_scraped_info or {}).get("error")
+    if scrape_error and scrape_error != NO_WEBSITE_ERROR:
+        raise RuntimeError(f"Website scrape failed: {scrape_error}")
+
+    start = time.perf_counter()
+    prompt1 = await veo_prompt_stage1_async(website_scraped_info)
+    timings["stage1"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    final_prompt = await veo_prompt_stage2_async(prompt1)
+    timings["stage2"] = time.perf_counter() - start
+
+    return {
+        "businessInfo": business,
+        "websiteScrapedInfo": website_scraped_info,
+        "stage1Prompt": prompt1,
+        "finalPrompt": final_prompt,
+        "timings": timings,
+    }
+
+
+async def _heartbeat_loop(
+    queue: WorkQueue,
+    worker_id: str,
+    lease_seconds: float,
+    interval: float,
+) -> None:
+    while True:
+        try:
+            metrics = dict(get_scheduler().metrics(), models=get_model_router().metrics())
+            await asyncio.to_thread(queue.heartbeat, worker_id, lease_seconds, metrics)
+        except Exception as e:
+            print(f"[{worker_id}] Heartbeat failed: {e}")
+        await asyncio.sleep(interval)
+
+
+async def _job_slot(
+    queue: WorkQueue,
+    worker_id: str,
+    crawler: Any,
+    lease_seconds: float,
+    max_attempts: int,
+    poll_seconds: float,
+    refresh_store: RefreshStore,
+    sink: Optional[ResultSink],
+    blobs: Optional[BlobStore],
+) -> None:
+    while True:
+        job = await asyncio.to_thread(queue.lease, worker_id, lease_seconds, max_attempts)
+        if job is None:
+            # Jobs leased by other workers may still come back if those
+            # workers die, so only stop once nothing is left in flight.
+            if not await asyncio.to_thread(queue.has_unfinished):
+                return
+            await asyncio.sleep(poll_seconds)
+            continue
+
+        print(f"[{worker_id}] Processing job {job['id']}: {job['business_name']}")
+        try:
+            if job["options"].get("refresh"):
+                result = await refresh_business(job["business_name"], job["address"], refresh_store, crawler)
+            else:
+                result = await run_pipeline_job(job, crawler)
+        except Exception as e:
+            print(f"[{worker_id}] Job {job['id']} failed: {e}")
+            error = "".join(traceback.format_exception_only(type(e), e)).strip()
+            await asyncio.to_thread(queue.fail, job["id"], worker_id, error, max_attempts)
+            continue
+
+        row = None
+        if sink is not None:
+            # Blobs are content-addressed, so writing them before knowing
+            # whether we still hold the lease is harmless.
+            try:
+                row = await asyncio.to_thread(flatten_result, job, worker_id, result, blobs)
+            except Exception as e:
+                print(f"[{worker_id}] Job {job['id']} result could not be stored: {e}")
+                error = "".join(traceback.format_exception_only(type(e), e)).strip()
+                await asyncio.to_thread(queue.fail, job["id"], worker_id, error, max_attempts)
+                continue
+            result = slim_result(result, row)
+
+        if not await asyncio.to_thread(queue.complete, job["id"], worker_id, result):
+            print(f"[{worker_id}] Lost the lease on job {job['id']}; result discarded")
+        elif row is not None:
+            # A full buffer is written out as a row group; keep that off the loop.
+            await asyncio.to_thread(sink.write, row)
+
+
+async def run_worker(
+    db_path: str,
+    worker_id: Optional[str] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    heartbeat_seconds: float = DEFAULT_HEARTBEAT_SECONDS,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    poll_seconds: float = DEFAULT_POLL_SECONDS,
+    service_shares: int = 1,
+    results_dir: Optional[str] = None,
+    local_only: bool = False,
+) -> None:
+    """
+    Pull jobs from the queue until it is drained.
+
+    The worker starts one browser and runs up to `concurrency` businesses on
+    it at a time. A background heartbeat keeps its leases alive; if the
+    worker dies, its jobs are re-queued once the leases expire. The heartbeat
+    also publishes the worker's rate controller and model router metrics.
+
+    Args:
+        db_path: Path to the shared queue database
+        worker_id: Unique worker ID (derived from host and PID if omitted)
+        concurrency: Businesses processed concurrently by this worker
+        lease_seconds: Lease length; must be well above heartbeat_seconds
+        heartbeat_seconds: Interval between lease renewals
+        max_attempts: Attempts before a job is marked as failed
+        poll_seconds: Wait between polls while other workers finish
+        service_shares: Number of workers sharing the account-wide API quotas
+        results_dir: If set, results are also streamed to Parquet files under
+            results_dir/parquet, with large blobs in results_dir/blobs, and
+            the queue database keeps only blob references
+        local_only: Open the queue with WAL journaling (single-host queues only)
+    """
+    from crawl4ai import AsyncWebCrawler
+    from src.utils.website_scraper import get_browser_config
+
+    queue = WorkQueue(db_path, local_only=local_only)
+    worker_id = worker_id or make_worker_id()
+    configure_scheduler(split_limits(DEFAULT_LIMITS, service_shares))
+    refresh_store = RefreshStore(db_path)
+
+    sink = blobs = None
+    if results_dir:
+        blobs = BlobStore(os.path.join(results_dir, "blobs"))
+        sink = ResultSink(os.path.join(results_dir, "parquet"), prefix=worker_id)
+
+    heartbeat = asyncio.create_task(
+        _heartbeat_loop(queue, worker_id, lease_seconds, heartbeat_seconds)
+    )
+    try:
+        async with AsyncWebCrawler(config=get_browser_config()) as crawler:
+            await asyncio.gather(*(
+                _job_slot(
+                    queue, worker_id, crawler, lease_seconds, max_attempts, poll_seconds,
+                    refresh_store, sink, blobs,
+                )
+                for _ in range(concurrency)
+            ))
+    finally:
+        heartbeat.cancel()
+        if sink is not None:
+            await asyncio.to_thread(sink.close)
+
+    print(f"[{worker_id}] Queue drained, exiting")
+
+
+def _worker_process(db_path: str, index: int, options: Dict[str, Any]) -> None:
+    asyncio.run(run_worker(db_path, worker_id=make_worker_id(index), **options))
+
+
+def run_sharded(
+    db_path: str,
+    processes: Optional[int] = None,
+    local_only: bool = False,
+    **worker_options: Any,
+) -> Dict[str, int]:
+    """
+    Run the queue to completion using several local worker processes.
+
+    Args:
+        db_path: Path to the shared queue database
+        processes: Number of worker processes (defaults to the CPU count)
+        local_only: Open the queue with WAL journaling (single-host queues only)
+        **worker_options: Passed through to run_worker; service_shares
+            defaults to the number of processes
+
+    Returns:
+        Final job counts by status
+    """
+    processes = processes or os.cpu_count() or 1
+    worker_options.setdefault("service_shares", processes)
+    oversubscribed = oversubscribed_services(DEFAULT_LIMITS, worker_options["service_shares"])
+    if oversubscribed:
+        print(
+            f"Warning: {processes} processes can exceed the account-wide limits for "
+            f"{', '.join(oversubscribed)}, since every process keeps at least one request "
+            "in flight per service; use fewer --processes to stay under them"
+        )
+    worker_options["local_only"] = local_only
+
+    # Spawn rather than fork: each worker starts its own browser and event
+    # loop, neither of which survives a fork.
+    context = multiprocessing.get_context("spawn")
+    workers: List[multiprocessing.process.BaseProcess] = []
+    for index in range(processes):
+        process = context.Process(
+            target=_worker_process,
+            args=(db_path, index, worker_options),
+            name=f"localfluence-worker-{index}",
+        )
+        process.start()
+        workers.append(process)
+
+    for process in workers:
+        process.join()
+
+    return WorkQueue(db_path, local_only=local_only).stats()
@@ -11,6 +11,8 @@ import googlemaps
 import requests
 from typing import Dict, List, Optional, Any
 from src.config import GOOGLE_API_KEY
+from src.utils.rate_controller import get_scheduler
+from src.utils.place_resolver import get_place_resolver
 
 
 # Initialize Google Maps client
@@ -21,6 +23,28 @@ if not GOOGLE_API_KEY:
 
 gmaps = googlemaps.Client(key=GOOGLE_API_KEY)
 
+
+class PlacesRateLimitError(RuntimeError):
+    """Raised when the Places API answers with OVER_QUERY_LIMIT."""
+
+
+class PlaceNotFoundError(LookupError):
+    """Raised when Place Details does not know a place ID, e.g. because it expired."""
+
+
+def _places_request(url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    # Places reports quota errors in the body of a 200 response. Raising
+    # inside the slot counts the call as throttled and lets the batch queue
+    # retry the job rather than treating the business as not found.
+    with get_scheduler().slot("places"):
+        response = requests.get(url, params=params)
+        response.raise_for_status()
+        result = response.json()
+        if result.get("status") == "OVER_QUERY_LIMIT":
+            raise PlacesRateLimitError(result.get("error_message") or "Places API quota exceeded")
+    return result
+
+
 def get_business_details(place_id: str) -> Dict[str, Any]:
     """
     Get detailed information for a business by place ID.
@@ -33,17 +57,24 @@ def get_business_details(place_id: str) -> Dict[str, Any]:
         
     Raises:
         requests.RequestException: If API request fails
+        PlacesRateLimitError: If the Places API quota is exceeded
+        PlaceNotFoundError: If the place ID is unknown or no longer valid
+        RuntimeError: If the API reports any other error
     """
     url = "https://maps.googleapis.com/maps/api/place/details/json"
     params = {
         "key": GOOGLE_API_KEY,
         "place_id": place_id,
-        "fields": "name,formatted_address,formatted_phone_number,website,rating,user_ratings_total,types,icon_background_color,opening_hours"
+        "fields": "place_id,name,formatted_address,formatted_phone_number,website,rating,user_ratings_total,types,icon_background_color,opening_hours"
     }
     
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    return response.json()["result"]
+    result = _places_request(url, params)
+    status = result.get("status")
+    if status in ("NOT_FOUND", "INVALID_REQUEST"):
+        raise PlaceNotFoundError(f"Place ID {place_id} not found: {status}")
+    if "result" not in result:
+        raise RuntimeError(f"Place Details failed: {status} {result.get('error_message', '')}".strip())
+    return result["result"]
 
 
 
@@ -53,6 +84,10 @@ def find_one_business(name: str, address: str) -> Optional[Dict[str, Any]]:
     """
     Find a specific business by name and address.
     
+    Lookups are answered from the local place index when it has a confident
+    match; otherwise the Find Place endpoint is called and its answer is
+    added to the index.
+    
     Args:
         name: Business name
         address: Business address
@@ -62,8 +97,19 @@ def find_one_business(name: str, address: str) -> Optional[Dict[str, Any]]:
         
     Raises:
         requests.RequestException: If API request fails
+        PlacesRateLimitError: If the Places API quota is exceeded
         KeyError: If no candidates found in response
     """
+    resolver = get_place_resolver()
+    if resolver:
+        place_id = resolver.resolve(name, address)
+        if place_id:
+            try:
+                return get_business_details(place_id)
+            except PlaceNotFoundError:
+                # Place IDs can expire; look the business up again.
+                print(f"Indexed place ID {place_id} has expired")
+
     search_text = f"{name}, {address}"
     url = "https://maps.googleapis.com/maps/api/place/findplacefromtext/json"
     params = {
@@ -73,19 +119,22 @@ def find_one_business(name: str, address: str) -> Optional[Dict[str, Any]]:
         "key": GOOGLE_API_KEY
     }
 
-    response = requests.get(url, params=params)
-    response.raise_for_status()
+    result = _places_request(url, params)
     
-    result = response.json()
     if not result.get('candidates'):
         print("No matching place found.")
         return None
     
-    place_id = result['candidates'][0]['place_id']
+    candidate = result['candidates'][0]
+    place_id = candidate['place_id']
     if not place_id:
         print("No matching place found.")
         return None
     
+    if resolver:
+        resolver.add(place_id, candidate.get('name'), candidate.get('formatted_address'))
+        resolver.add(place_id, name, address)
+    
     return get_business_details(place_id)
 
 
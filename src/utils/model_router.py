@@ -0,0 +1,280 @@
+"""
+Model Router Module
+
+This module picks the LLM used for extraction and prompt generation and
+keeps one slow or failing provider from stalling a business:
+
+- Routes are tried in the order listed in prompts.json, skipping any whose
+  max_input_chars is below the size of the input.
+- If the primary route has not answered by its p95 latency, a hedged
+  duplicate request goes to the next route; whichever finishes first wins
+  and the other is cancelled.
+- If a route fails, the next one is tried straight away.
+
+Each request runs inside the rate controller slot of its provider.
+
+Author: Localfluence Team
+"""
+
+import asyncio
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from src.config import GROQ_BASE_URL, OPENAI_BASE_URL, get_groq_api_key, get_openai_api_key
+from src.prompts.gpt_prompts import MODEL_ROUTES
+from src.utils.rate_controller import get_scheduler
+
+
+LATENCY_SAMPLES = 200
+MIN_LATENCY_SAMPLES = 20
+DEFAULT_HEDGE_AFTER_SECONDS = 30.0
+
+API_CREDENTIALS = {
+    "groq": (get_groq_api_key, GROQ_BASE_URL),
+    "openai": (get_openai_api_key, OPENAI_BASE_URL),
+}
+
+
+def get_route_credentials(route: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+    """
+    Get the API key and base URL for a route.
+
+    Args:
+        route: Route from the model_routes configuration
+
+    Returns:
+        (api_key, base_url); base_url is None for the provider's default
+
+    Raises:
+        ValueError: If the route's API is unknown or its key is not configured
+    """
+    if route["api"] not in API_CREDENTIALS:
+        raise ValueError(f"Unknown API for model route {route['name']}: {route['api']}")
+    get_api_key, base_url = API_CREDENTIALS[route["api"]]
+    return get_api_key(), route.get("base_url") or base_url
+
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def get_route_client(route: Dict[str, Any]) -> Any:
+    """
+    Get the AsyncOpenAI client for a route, shared so connections are reused.
+
+    Routes on the same API and endpoint share a client. Clients are bound
+    to the event loop that uses them, so each running loop gets its own (the
+    sync prompt wrappers start a new loop on every call).
+
+    Args:
+        route: Route from the model_routes configuration
+
+    Returns:
+        AsyncOpenAI client for the route's endpoint
+
+    Raises:
+        ValueError: If the route's API is unknown or its key is not configured
+        RuntimeError: If called outside a running event loop
+    """
+    # Imported here so that queue management does not need the OpenAI client.
+    from openai import AsyncOpenAI
+
+    api_key, base_url = get_route_credentials(route)
+    key = f"{route['api']}:{base_url}"
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        clients = _clients.setdefault(loop, {})
+        if key not in clients:
+            clients[key] = AsyncOpenAI(api_key=api_key, base_url=base_url)
+        return clients[key]
+
+
+class LatencyTracker:
+    """Rolling window of request latencies for one route."""
+
+    def __init__(self, size: int = LATENCY_SAMPLES):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def record(self, latency: float) -> None:
+        self.samples.append(latency)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Return the given percentile, or None until enough samples are in."""
+        if len(self.samples) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ModelRouter:
+    """Routes LLM requests by task and input size, with hedging and failover."""
+
+    def __init__(self, routes: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        Create a router.
+
+        Args:
+            routes: Routes per task (defaults to model_routes in prompts.json)
+        """
+        self.routes = routes or MODEL_ROUTES
+        self._latencies: Dict[str, LatencyTracker] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def candidates(self, task: str, input_chars: int) -> List[Dict[str, Any]]:
+        """
+        List the routes that can take an input, in order of preference.
+
+        If the input is too large for every route, the route with the
+        largest max_input_chars is returned on its own.
+
+        Args:
+            task: Task name, e.g. "extraction" or "generation"
+            input_chars: Size of the input in characters
+
+        Returns:
+            Routes to try, in order
+
+        Raises:
+            ValueError: If the task has no routes
+        """
+        routes = self.routes.get(task, {}).get("routes", [])
+        if not routes:
+            raise ValueError(f"No model routes configured for task: {task}")
+
+        fitting = [route for route in routes if input_chars <= route.get("max_input_chars", float("inf"))]
+        if fitting:
+            return fitting
+
+        largest = max(routes, key=lambda route: route.get("max_input_chars", 0))
+        print(f"Input of {input_chars} characters exceeds every {task} route; trying {largest['name']}")
+        return [largest]
+
+    def hedge_delay(self, task: str, route: Dict[str, Any]) -> float:
+        """Return how long to wait on a route before hedging: its p95, or the task default."""
+        with self._lock:
+            tracker = self._latencies.get(route["name"])
+            p95 = tracker.percentile(0.95) if tracker else None
+        if p95 is not None:
+            return p95
+        return self.routes[task].get("hedge_after_seconds", DEFAULT_HEDGE_AFTER_SECONDS)
+
+    def _count(self, route: Dict[str, Any], event: str) -> None:
+        with self._lock:
+            counts = self._counts.setdefault(route["name"], {})
+            counts[event] = counts.get(event, 0) + 1
+
+    async def _run(self, route: Dict[str, Any], request: Callable[[Dict[str, Any]], Awaitable[Any]]) -> Any:
+        start = time.monotonic()
+        try:
+            async with get_scheduler().aslot(route["api"]):
+                result = await request(route)
+        except asyncio.CancelledError:
+            # A request that lost a hedge took at least this long; leaving it
+            # out would bias the p95 towards the fast requests.
+            self._record_latency(route, time.monotonic() - start)
+            raise
+        self._record_latency(route, time.monotonic() - start)
+        return result
+
+    def _record_latency(self, route: Dict[str, Any], latency: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(route["name"], LatencyTracker()).record(latency)
+
+    async def call(
+        self,
+        task: str,
+        input_chars: int,
+        request: Callable[[Dict[str, Any]], Awaitable[Any]],
+    ) -> Tuple[Dict[str, Any], Any]:
+        """
+        Run a request on the best route, hedging and failing over as needed.
+
+        At most two routes are in flight at once: the primary and one hedge.
+
+        Args:
+            task: Task name, e.g. "extraction" or "generation"
+            input_chars: Size of the input in characters
+            request: Coroutine function that performs the request on a route
+
+        Returns:
+            (route, result) for the route that answered first
+
+        Raises:
+            Exception: The last route's error if every route failed
+        """
+        routes = self.candidates(task, input_chars)
+        pending: Dict[asyncio.Task, Dict[str, Any]] = {}
+        next_index = 0
+        hedged = False
+        last_error: Optional[BaseException] = None
+
+        def launch() -> None:
+            nonlocal next_index
+            route = routes[next_index]
+            next_index += 1
+            pending[asyncio.create_task(self._run(route, request))] = route
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if not hedged and len(pending) == 1 and next_index < len(routes):
+                    timeout = self.hedge_delay(task, next(iter(pending.values())))
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    self._count(routes[next_index], "hedged")
+                    launch()
+                    continue
+
+                for finished in done:
+                    route = pending.pop(finished)
+                    error = finished.exception()
+                    if error is None:
+                        self._count(route, "won")
+                        return route, finished.result()
+                    print(f"Model route {route['name']} failed: {error}")
+                    self._count(route, "failed")
+                    last_error = error
+
+                if not pending and next_index < len(routes):
+                    self._count(routes[next_index], "failover")
+                    launch()
+        finally:
+            for task_in_flight in pending:
+                task_in_flight.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        raise last_error
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return p95 latency and hedge/failover counts for every route used."""
+        with self._lock:
+            names = set(self._latencies) | set(self._counts)
+            return {
+                name: {
+                    "p95": self._latencies[name].percentile(0.95) if name in self._latencies else None,
+                    "samples": len(self._latencies[name].samples) if name in self._latencies else 0,
+                    **self._counts.get(name, {}),
+                }
+                for name in sorted(names)
+            }
+
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Get the process-wide model router."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
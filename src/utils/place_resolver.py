@@ -0,0 +1,388 @@
+"""
+Place Resolver Module
+
+This module keeps a local index of places already resolved through the
+Find Place endpoint, so repeated lookups with small spelling differences
+("Hamiltons" vs "Hamilton's", "Ave" vs "Avenue") can skip the API.
+
+Names are matched by trigram similarity, with a small bonus for matching
+Soundex codes; addresses by normalized tokens, where a different house
+number, street, city, state or ZIP code rules a candidate out. Candidates are
+bucketed by postal code and by house number and street, so a lookup only
+scores a handful of entries. Only a confident, unambiguous match is
+returned; anything else falls back to the live API, whose answer is then
+added to the index.
+
+Author: Localfluence Team
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from src.config import PLACE_INDEX_PATH
+
+
+DEFAULT_THRESHOLD = 0.85
+DEFAULT_AMBIGUITY_MARGIN = 0.05
+NAME_WEIGHT = 0.6
+PHONETIC_MIN_SIMILARITY = 0.5
+PHONETIC_BONUS = 0.1
+
+ADDRESS_ABBREVIATIONS = {
+    "ave": "avenue", "av": "avenue", "st": "street", "str": "street", "rd": "road",
+    "blvd": "boulevard", "dr": "drive", "ln": "lane", "ct": "court", "pl": "place",
+    "pkwy": "parkway", "hwy": "highway", "sq": "square", "ter": "terrace", "cir": "circle",
+    "ste": "suite", "apt": "apartment", "fl": "floor",
+    "n": "north", "s": "south", "e": "east", "w": "west",
+    "ne": "northeast", "nw": "northwest", "se": "southeast", "sw": "southwest",
+}
+DIRECTIONS = {"north", "south", "east", "west", "northeast", "northwest", "southeast", "southwest"}
+STREET_SUFFIXES = {
+    "avenue", "street", "road", "boulevard", "drive", "lane", "court", "place", "parkway",
+    "highway", "square", "terrace", "circle", "way", "trail", "plaza", "alley",
+}
+COUNTRY_TOKENS = {"usa", "us", "united", "states", "america"}
+
+SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"), **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"), "l": "4", **dict.fromkeys("mn", "5"), "r": "6",
+}
+
+LOCALITY_PATTERNS = (
+    re.compile(r"(?P<state>[a-z]{2})?\s*(?P<zip>\d{5})?(?:\s+\d{4})?"),
+    # "City STATE ZIP" when the comma after the city is missing.
+    re.compile(r"(?P<city>.+?)\s+(?P<state>[a-z]{2})\s+(?P<zip>\d{5})(?:\s+\d{4})?"),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS place_index (
+    place_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    address TEXT NOT NULL,
+    PRIMARY KEY (place_id, name, address)
+);
+"""
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase a business name and drop apostrophes and punctuation."""
+    name = name.lower().replace("&", " and ")
+    name = re.sub(r"['’`]", "", name)
+    name = re.sub(r"[^a-z0-9]+", " ", name)
+    return name.strip()
+
+
+def normalize_address(address: str) -> List[str]:
+    """Split an address into lowercase tokens with street abbreviations expanded."""
+    address = re.sub(r"['’`]", "", address.lower())
+    tokens = re.findall(r"[a-z0-9]+", address)
+    tokens = [ADDRESS_ABBREVIATIONS.get(token, token) for token in tokens]
+    return [token for token in tokens if token not in COUNTRY_TOKENS]
+
+
+def trigrams(text: str) -> Set[str]:
+    """Return the character trigrams of a padded string."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def soundex(word: str) -> str:
+    """Return the four-character American Soundex code of a word."""
+    word = re.sub(r"[^a-z]", "", word.lower())
+    if not word:
+        return ""
+
+    code = word[0].upper()
+    previous = SOUNDEX_CODES.get(word[0], "")
+    for char in word[1:]:
+        digit = SOUNDEX_CODES.get(char, "")
+        if digit and digit != previous:
+            code += digit
+        # h and w do not separate letters with the same code; vowels do.
+        if char not in "hw":
+            previous = digit
+    return (code + "000")[:4]
+
+
+def _match_locality(part: str) -> Optional[Dict[str, Optional[str]]]:
+    for pattern in LOCALITY_PATTERNS:
+        match = pattern.fullmatch(part)
+        if match and (match.group("state") or match.group("zip")):
+            return match.groupdict()
+    return None
+
+
+def parse_locality(address: str) -> Dict[str, str]:
+    """
+    Pick the city, state and ZIP code out of a comma-separated US address.
+
+    Works on the raw comma-separated parts, before abbreviation expansion,
+    so state codes such as "CT" or "FL" are not mistaken for street words.
+    The city is the part before "STATE ZIP", or the second part when there
+    is no state.
+
+    Args:
+        address: Address such as "174 E Magnolia Ave, Auburn, AL 36830, USA"
+
+    Returns:
+        Dictionary with whichever of "city", "state" and "zip" were found
+    """
+    parts = [normalize_name(part) for part in address.split(",")]
+    while parts and set(parts[-1].split()) <= COUNTRY_TOKENS:
+        parts.pop()
+
+    locality: Dict[str, str] = {}
+    city_index = 1
+    for index in range(len(parts) - 1, 0, -1):
+        fields = _match_locality(parts[index])
+        if fields is None:
+            continue
+
+        if fields.get("city"):
+            parts[index] = fields["city"]
+            city_index = index
+        else:
+            city_index = index - 1
+        locality.update({component: fields[component] for component in ("state", "zip") if fields[component]})
+        break
+
+    if 0 < city_index < len(parts) and parts[city_index] and not re.search(r"\d", parts[city_index]):
+        locality["city"] = parts[city_index]
+    return locality
+
+
+def parse_street(address: str) -> Dict[str, str]:
+    """
+    Split the street line of an address into its direction, name and suffix.
+
+    "55 N 1st Ave" gives {"direction": "north", "street": "1st", "suffix": "avenue"};
+    a direction after the suffix ("Main St NW") counts too.
+
+    Args:
+        address: Address whose first comma-separated part is the street line
+
+    Returns:
+        Dictionary with whichever of "direction", "street" and "suffix" were found
+    """
+    tokens = normalize_address(address.split(",")[0])
+    if tokens and tokens[0].isdigit():
+        tokens = tokens[1:]
+    if not tokens:
+        return {}
+
+    # Leading directions, unless the direction is the street name itself
+    # ("100 North St", but not "5 N Court St").
+    start = 0
+    while start < len(tokens) - 1 and tokens[start] in DIRECTIONS and (
+        tokens[start + 1] not in STREET_SUFFIXES
+        or (start + 2 < len(tokens) and tokens[start + 2] in STREET_SUFFIXES)
+    ):
+        start += 1
+    directions = tokens[:start]
+
+    end = next((i for i in range(start + 1, len(tokens)) if tokens[i] in STREET_SUFFIXES), None)
+    street = {"street": " ".join(tokens[start:end])}
+    if end is not None:
+        street["suffix"] = tokens[end]
+        if end + 1 < len(tokens) and tokens[end + 1] in DIRECTIONS:
+            directions.append(tokens[end + 1])
+    if directions:
+        street["direction"] = " ".join(directions)
+    return street
+
+
+def _address_keys(tokens: List[str]) -> Set[str]:
+    keys = set()
+    for token in tokens:
+        if re.fullmatch(r"\d{5}", token):
+            keys.add(f"zip:{token}")
+
+    # House number followed by the first street token that is not a direction.
+    if tokens and tokens[0].isdigit():
+        street = next((token for token in tokens[1:] if token not in DIRECTIONS), None)
+        if street:
+            keys.add(f"street:{tokens[0]}:{street}")
+    return keys
+
+
+class _Entry:
+    __slots__ = ("place_id", "name", "address", "trigrams", "phonetic", "tokens", "components", "keys")
+
+    def __init__(self, place_id: str, name: str, address: str):
+        self.place_id = place_id
+        self.name = name
+        self.address = address
+
+        normalized = normalize_name(name)
+        self.trigrams = trigrams(normalized)
+        self.phonetic = tuple(soundex(word) for word in normalized.split())
+        self.tokens = normalize_address(address)
+        self.components = {**parse_street(address), **parse_locality(address)}
+        self.keys = _address_keys(self.tokens)
+
+
+def _name_score(query: _Entry, entry: _Entry) -> float:
+    union = query.trigrams | entry.trigrams
+    score = len(query.trigrams & entry.trigrams) / len(union) if union else 0.0
+    # Soundex codes collide far too often to carry a match on their own
+    # ("Mitch Music" and "Matcha Magic" share them), so they only nudge up
+    # names that are already similar.
+    if score >= PHONETIC_MIN_SIMILARITY and query.phonetic and query.phonetic == entry.phonetic:
+        score = min(1.0, score + PHONETIC_BONUS)
+    return score
+
+
+def _address_score(query: _Entry, entry: _Entry) -> float:
+    # A different house number is a different place, however similar the rest.
+    if query.tokens and entry.tokens and query.tokens[0].isdigit() and entry.tokens[0].isdigit():
+        if query.tokens[0] != entry.tokens[0]:
+            return 0.0
+
+    # So is a different street direction, name or suffix ("E Main St" vs
+    # "W Main St", "1st Ave" vs "1st St"), city, state or ZIP code.
+    # Components missing from either side are not evidence either way.
+    for component, value in query.components.items():
+        if entry.components.get(component, value) != value:
+            return 0.0
+
+    query_tokens, entry_tokens = set(query.tokens), set(entry.tokens)
+    smaller = min(len(query_tokens), len(entry_tokens))
+    # Overlap rather than Jaccard: queries often omit the ZIP code or city.
+    return len(query_tokens & entry_tokens) / smaller if smaller else 0.0
+
+
+class PlaceResolver:
+    """In-memory fuzzy index of resolved places, persisted to SQLite."""
+
+    def __init__(
+        self,
+        db_path: str,
+        threshold: float = DEFAULT_THRESHOLD,
+        ambiguity_margin: float = DEFAULT_AMBIGUITY_MARGIN,
+    ):
+        """
+        Load the index from disk.
+
+        Args:
+            db_path: Path to the SQLite database file
+            threshold: Minimum score for a match to skip the API
+            ambiguity_margin: A match is ambiguous when another place scores
+                within this margin of it
+        """
+        self.db_path = db_path
+        self.threshold = threshold
+        self.ambiguity_margin = ambiguity_margin
+
+        self._entries: Dict[Tuple[str, str, str], _Entry] = {}
+        self._buckets: Dict[str, List[_Entry]] = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            for row in conn.execute("SELECT place_id, name, address FROM place_index"):
+                self._insert(_Entry(*row))
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _insert(self, entry: _Entry) -> bool:
+        key = (entry.place_id, entry.name, entry.address)
+        if key in self._entries:
+            return False
+        self._entries[key] = entry
+        for bucket in entry.keys:
+            self._buckets.setdefault(bucket, []).append(entry)
+        return True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, place_id: str, name: str, address: str) -> None:
+        """
+        Add a resolved place to the index.
+
+        Call this with the canonical name and address from the API and again
+        with the query that resolved to it, so the same query matches exactly
+        next time.
+
+        Args:
+            place_id: Google Places place ID
+            name: Business name
+            address: Business address
+        """
+        if not place_id or not name or not address:
+            return
+
+        with self._lock:
+            if not self._insert(_Entry(place_id, name, address)):
+                return
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO place_index (place_id, name, address) VALUES (?, ?, ?)",
+                (place_id, name, address),
+            )
+
+    def score(self, name: str, address: str) -> List[Tuple[float, str]]:
+        """
+        Score the indexed places that share a bucket with the query.
+
+        Args:
+            name: Business name
+            address: Business address
+
+        Returns:
+            (score, place_id) pairs, best first, one per place
+        """
+        query = _Entry("", name, address)
+
+        with self._lock:
+            candidates = {id(entry): entry for key in query.keys for entry in self._buckets.get(key, ())}
+
+        best: Dict[str, float] = {}
+        for entry in candidates.values():
+            score = NAME_WEIGHT * _name_score(query, entry) + (1 - NAME_WEIGHT) * _address_score(query, entry)
+            best[entry.place_id] = max(score, best.get(entry.place_id, 0.0))
+        return sorted(((score, place_id) for place_id, score in best.items()), reverse=True)
+
+    def resolve(self, name: str, address: str) -> Optional[str]:
+        """
+        Resolve a business to a place ID without calling the API.
+
+        Args:
+            name: Business name
+            address: Business address
+
+        Returns:
+            The place ID of a confident, unambiguous match, or None
+        """
+        scores = self.score(name, address)
+        if not scores or scores[0][0] < self.threshold:
+            return None
+        if len(scores) > 1 and scores[0][0] - scores[1][0] < self.ambiguity_margin:
+            return None
+        return scores[0][1]
+
+
+_resolver: Optional[PlaceResolver] = None
+_resolver_lock = threading.Lock()
+
+
+def get_place_resolver() -> Optional[PlaceResolver]:
+    """Get the process-wide resolver, or None if PLACE_INDEX_PATH is empty."""
+    global _resolver
+    if not PLACE_INDEX_PATH:
+        return None
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = PlaceResolver(PLACE_INDEX_PATH)
+        return _resolver
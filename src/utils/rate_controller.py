@@ -0,0 +1,412 @@
+"""
+Rate Controller Module
+
+This module regulates how many requests Localfluence has in flight against
+each external service (Google Places, website crawls, Groq and OpenAI). Each
+service gets an AIMD concurrency window: it grows additively while latency
+and error rates stay healthy and shrinks multiplicatively on rate limits and
+timeouts. Crawls are additionally limited per domain to stay polite to the
+target websites.
+
+Limiters work from both threads and asyncio tasks, so the synchronous Places
+and OpenAI clients and the async crawler share the same windows.
+
+Author: Localfluence Team
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+
+# Window settings per service. Services marked "shared" are account-wide API
+# quotas, so their windows are split between worker processes.
+DEFAULT_LIMITS: Dict[str, Dict[str, Any]] = {
+    "places": {"initial": 4, "minimum": 1, "maximum": 32, "latency_tolerance": 3.0, "shared": True},
+    "crawl": {"initial": 4, "minimum": 1, "maximum": 16, "latency_tolerance": None, "shared": False},
+    "groq": {"initial": 2, "minimum": 1, "maximum": 16, "latency_tolerance": None, "shared": True},
+    "openai": {"initial": 4, "minimum": 1, "maximum": 32, "latency_tolerance": None, "shared": True},
+}
+
+# Politeness limits applied to every crawled domain.
+DOMAIN_LIMITS: Dict[str, Any] = {"initial": 1, "minimum": 1, "maximum": 2, "latency_tolerance": 2.0}
+
+THROTTLE_STATUS_CODES = {429, 503}
+THROTTLE_MESSAGES = ("429", "503", "rate limit", "too many requests", "timeout", "timed out")
+
+
+def is_throttle_error(error: BaseException) -> bool:
+    """
+    Decide whether an exception means the service is overloaded.
+
+    Rate limit responses (HTTP 429/503) and timeouts count as throttling.
+    Client libraries are recognised by status code or class name so that
+    none of them has to be imported here.
+
+    Args:
+        error: Exception raised by the request
+
+    Returns:
+        True if the window should shrink, False for ordinary errors
+    """
+    if isinstance(error, TimeoutError):
+        return True
+
+    status_code = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    if status_code is None and response is not None:
+        status_code = getattr(response, "status_code", None)
+    if status_code in THROTTLE_STATUS_CODES:
+        return True
+
+    name = type(error).__name__
+    return "Timeout" in name or "RateLimit" in name
+
+
+def is_throttle_message(message: Optional[str]) -> bool:
+    """Decide whether an error message reported without an exception means throttling."""
+    message = (message or "").lower()
+    return any(marker in message for marker in THROTTLE_MESSAGES)
+
+
+class SlotOutcome:
+    """Outcome of a single request made inside a limiter slot."""
+
+    def __init__(self):
+        self.kind = "success"
+
+    def mark_throttled(self) -> None:
+        """Report a rate limit that did not surface as an exception."""
+        self.kind = "throttled"
+
+    def mark_error(self) -> None:
+        """Report a failure that did not surface as an exception."""
+        if self.kind != "throttled":
+            self.kind = "error"
+
+    def record_exception(self, error: BaseException) -> None:
+        """Classify an exception raised inside the slot."""
+        if isinstance(error, asyncio.CancelledError):
+            self.kind = "cancelled"
+        elif is_throttle_error(error):
+            self.kind = "throttled"
+        else:
+            self.mark_error()
+
+
+class AIMDLimiter:
+    """
+    Concurrency window with additive increase and multiplicative decrease.
+
+    The window grows by `increase` per window's worth of healthy responses
+    (i.e. by roughly `increase` per round trip) and is multiplied by
+    `decrease` on throttling, at most once per cooldown period so that a
+    burst of 429s only counts once.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: float,
+        minimum: float,
+        maximum: float,
+        latency_tolerance: Optional[float] = None,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        error_threshold: float = 0.1,
+        smoothing: float = 0.2,
+        **_: Any,
+    ):
+        """
+        Create a limiter.
+
+        Args:
+            name: Service or domain name, used in metrics
+            initial: Starting window size
+            minimum: Smallest window size
+            maximum: Largest window size
+            latency_tolerance: Treat smoothed latency above this multiple of
+                the best latency seen as congestion; None disables the check
+            increase: Additive increase per round trip
+            decrease: Multiplicative decrease factor on throttling
+            error_threshold: Smoothed error rate above which the window stops growing
+            smoothing: Weight of the newest sample in the moving averages
+        """
+        self.name = name
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+        self.window = min(max(float(initial), self.minimum), self.maximum)
+        self.latency_tolerance = latency_tolerance
+        self.increase = increase
+        self.decrease = decrease
+        self.error_threshold = error_threshold
+        self.smoothing = smoothing
+
+        self.in_flight = 0
+        self.latency = None
+        self.best_latency = None
+        self.error_rate = 0.0
+        self.counts = {"success": 0, "error": 0, "throttled": 0, "cancelled": 0}
+        self._last_decrease = 0.0
+
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def _capacity(self) -> int:
+        return max(1, int(self.window))
+
+    def acquire(self) -> None:
+        """Block the calling thread until a slot is free."""
+        with self._condition:
+            while self.in_flight >= self._capacity():
+                self._condition.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self) -> None:
+        """Wait without blocking the event loop until a slot is free."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self.in_flight < self._capacity():
+                    self.in_flight += 1
+                    return
+                waiter = (loop, loop.create_future())
+                self._async_waiters.append(waiter)
+            try:
+                await waiter[1]
+            finally:
+                with self._lock:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+
+    def release(self, latency: float, outcome: str) -> None:
+        """
+        Free a slot and update the window from the request's outcome.
+
+        Args:
+            latency: Request duration in seconds
+            outcome: "success", "error", "throttled" or "cancelled"
+        """
+        with self._lock:
+            self.in_flight -= 1
+            self.counts[outcome] += 1
+            if outcome != "cancelled":
+                self._update(latency, outcome)
+            self._wake_waiters()
+
+    def _update(self, latency: float, outcome: str) -> None:
+        alpha = self.smoothing
+        failed = 1.0 if outcome != "success" else 0.0
+        self.error_rate = (1 - alpha) * self.error_rate + alpha * failed
+
+        if outcome == "throttled":
+            self._shrink()
+            return
+        if outcome == "error":
+            return
+
+        self.latency = latency if self.latency is None else (1 - alpha) * self.latency + alpha * latency
+        if self.best_latency is None or self.latency < self.best_latency:
+            self.best_latency = self.latency
+
+        if self.latency_tolerance and self.latency > self.best_latency * self.latency_tolerance:
+            self._shrink()
+            return
+
+        # Only grow when the window is actually in use; otherwise an idle
+        # service would drift to its maximum without ever being tested there.
+        if self.error_rate < self.error_threshold and self.in_flight + 1 >= self._capacity():
+            self.window = min(self.maximum, self.window + self.increase / self.window)
+
+    def _shrink(self) -> None:
+        now = time.monotonic()
+        cooldown = max(self.latency or 0.0, 1.0)
+        if now - self._last_decrease < cooldown:
+            return
+        self._last_decrease = now
+        self.window = max(self.minimum, self.window * self.decrease)
+
+    def _wake_waiters(self) -> None:
+        # Waiters re-check capacity themselves, so it is safe to wake them all.
+        self._condition.notify_all()
+        for loop, future in self._async_waiters:
+            loop.call_soon_threadsafe(_resolve_future, future)
+        self._async_waiters.clear()
+
+    @contextmanager
+    def slot(self) -> Iterator[SlotOutcome]:
+        """Hold a slot for the duration of a synchronous request."""
+        self.acquire()
+        outcome = SlotOutcome()
+        start = time.monotonic()
+        try:
+            yield outcome
+        except BaseException as e:
+            outcome.record_exception(e)
+            raise
+        finally:
+            self.release(time.monotonic() - start, outcome.kind)
+
+    @asynccontextmanager
+    async def aslot(self) -> AsyncIterator[SlotOutcome]:
+        """Hold a slot for the duration of an asynchronous request."""
+        await self.acquire_async()
+        outcome = SlotOutcome()
+        start = time.monotonic()
+        try:
+            yield outcome
+        except BaseException as e:
+            outcome.record_exception(e)
+            raise
+        finally:
+            self.release(time.monotonic() - start, outcome.kind)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return a snapshot of the window and its health signals."""
+        with self._lock:
+            return {
+                "window": round(self.window, 2),
+                "in_flight": self.in_flight,
+                "waiting": len(self._async_waiters),
+                "latency": round(self.latency, 3) if self.latency is not None else None,
+                "error_rate": round(self.error_rate, 3),
+                **self.counts,
+            }
+
+
+def _resolve_future(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class ConcurrencyScheduler:
+    """Registry of per-service and per-domain AIMD limiters."""
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Dict[str, Any]]] = None,
+        domain_limits: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Create a scheduler.
+
+        Args:
+            limits: Window settings per service (defaults to DEFAULT_LIMITS)
+            domain_limits: Window settings for each crawled domain
+        """
+        self.limits = limits or DEFAULT_LIMITS
+        self.domain_limits = domain_limits or DOMAIN_LIMITS
+        self._services: Dict[str, AIMDLimiter] = {}
+        self._domains: Dict[str, AIMDLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, service: str) -> AIMDLimiter:
+        """Get the limiter for a service, creating it on first use."""
+        with self._lock:
+            if service not in self._services:
+                settings = self.limits.get(service, DEFAULT_LIMITS["crawl"])
+                self._services[service] = AIMDLimiter(service, **settings)
+            return self._services[service]
+
+    def domain_limiter(self, url: str) -> AIMDLimiter:
+        """Get the politeness limiter for the domain of a URL."""
+        domain = urlparse(url).netloc.lower() or url.lower()
+        if domain.startswith("www."):
+            domain = domain[4:]
+        with self._lock:
+            if domain not in self._domains:
+                self._domains[domain] = AIMDLimiter(domain, **self.domain_limits)
+            return self._domains[domain]
+
+    def slot(self, service: str):
+        """Hold a slot for a synchronous request to a service."""
+        return self.limiter(service).slot()
+
+    def aslot(self, service: str):
+        """Hold a slot for an asynchronous request to a service."""
+        return self.limiter(service).aslot()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return live metrics for every service and crawled domain."""
+        with self._lock:
+            services = dict(self._services)
+            domains = dict(self._domains)
+        return {
+            "services": {name: limiter.metrics() for name, limiter in services.items()},
+            "domains": {
+                name: limiter.metrics()
+                for name, limiter in domains.items()
+                if limiter.in_flight or limiter.counts["throttled"]
+            },
+        }
+
+
+def split_limits(limits: Dict[str, Dict[str, Any]], shares: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Divide the shared service windows between several worker processes.
+
+    A window never drops below its minimum, so with more processes than
+    maximum / minimum the processes together can exceed the account-wide
+    maximum. oversubscribed_services lists the services where that happens.
+
+    Args:
+        limits: Window settings per service
+        shares: Number of processes sharing the account-wide quotas
+
+    Returns:
+        New window settings for a single process
+    """
+    split = {}
+    for service, settings in limits.items():
+        settings = dict(settings)
+        if settings.get("shared") and shares > 1:
+            for key in ("initial", "maximum"):
+                settings[key] = max(settings["minimum"], settings[key] / shares)
+        split[service] = settings
+    return split
+
+
+def oversubscribed_services(limits: Dict[str, Dict[str, Any]], shares: int) -> List[str]:
+    """
+    List the shared services whose maximum cannot be split between this many processes.
+
+    Args:
+        limits: Window settings per service
+        shares: Number of processes sharing the account-wide quotas
+
+    Returns:
+        Names of the services whose per-process minimum adds up to more
+        than their maximum
+    """
+    return [
+        service for service, settings in limits.items()
+        if settings.get("shared") and settings["minimum"] * shares > settings["maximum"]
+    ]
+
+
+_scheduler: Optional[ConcurrencyScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> ConcurrencyScheduler:
+    """Get the process-wide scheduler, creating it with the default limits."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ConcurrencyScheduler()
+        return _scheduler
+
+
+def configure_scheduler(
+    limits: Optional[Dict[str, Dict[str, Any]]] = None,
+    domain_limits: Optional[Dict[str, Any]] = None,
+) -> ConcurrencyScheduler:
+    """Replace the process-wide scheduler with one using custom limits."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = ConcurrencyScheduler(limits, domain_limits)
+        return _scheduler
@@ -0,0 +1,432 @@
+"""
+Refresh Scheduler Module
+
+This module re-runs the pipeline incrementally for businesses that have
+already been processed. Cheap change checks decide which stages need to run
+again:
+
+- Places details are fetched directly by place ID and diffed field by field;
+  a change re-runs the prompt generation stages.
+- The website is checked with a conditional GET, then the sitemap's lastmod,
+  then a fingerprint of its reduced markdown; only a real content change
+  re-runs the LLM extraction (and the stages after it).
+
+Refresh jobs are queued on the WorkQueue with the most stale businesses first.
+
+Author: Localfluence Team
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+from src.utils.rate_controller import get_scheduler
+from src.utils.work_queue import WorkQueue
+
+
+# Places fields that feed the generation stages. Rating and review counts
+# change constantly without changing what the prompt should say.
+PLACES_FIELDS = [
+    "name",
+    "formatted_address",
+    "formatted_phone_number",
+    "website",
+    "types",
+    "opening_hours",
+]
+
+REQUEST_TIMEOUT = 15
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS business_state (
+    business_name TEXT NOT NULL,
+    address TEXT NOT NULL,
+    place_id TEXT,
+    places_fields TEXT,
+    website TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    sitemap_lastmod TEXT,
+    content_fingerprint TEXT,
+    website_scraped_info TEXT,
+    stage1_prompt TEXT,
+    final_prompt TEXT,
+    checked_at REAL,
+    refreshed_at REAL,
+    PRIMARY KEY (business_name, address)
+);
+"""
+
+JSON_COLUMNS = ("places_fields", "website_scraped_info", "final_prompt")
+
+
+class RefreshStore:
+    """Per-business change detection state, stored alongside the work queue."""
+
+    def __init__(self, db_path: str, busy_timeout: float = 30.0):
+        """
+        Open (and create if needed) the state table.
+
+        Args:
+            db_path: Path to the SQLite database file (usually the queue database)
+            busy_timeout: Seconds to wait for a lock held by another worker
+        """
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def get(self, business_name: str, address: str) -> Dict[str, Any]:
+        """
+        Get the stored state for a business.
+
+        Returns:
+            The state as a dictionary, empty if the business was never refreshed
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM business_state WHERE business_name = ? AND address = ?",
+                (business_name, address),
+            ).fetchone()
+        if row is None:
+            return {}
+
+        state = dict(row)
+        for column in JSON_COLUMNS:
+            if state[column] is not None:
+                state[column] = json.loads(state[column])
+        return state
+
+    def save(self, business_name: str, address: str, state: Dict[str, Any]) -> None:
+        """Replace the stored state for a business."""
+        row = {column: state.get(column) for column in (
+            "place_id", "places_fields", "website", "etag", "last_modified", "sitemap_lastmod",
+            "content_fingerprint", "website_scraped_info", "stage1_prompt", "final_prompt",
+            "checked_at", "refreshed_at",
+        )}
+        for column in JSON_COLUMNS:
+            if row[column] is not None:
+                row[column] = json.dumps(row[column], default=str)
+
+        columns = ["business_name", "address", *row]
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO business_state ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})",
+                (business_name, address, *row.values()),
+            )
+
+    def last_refreshed(self) -> Dict[Tuple[str, str], float]:
+        """Return when each known business was last refreshed."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT business_name, address, refreshed_at FROM business_state"
+            ).fetchall()
+        return {(row["business_name"], row["address"]): row["refreshed_at"] or 0.0 for row in rows}
+
+
+def enqueue_refresh(queue: WorkQueue, store: RefreshStore, roster: List[Tuple[str, str]]) -> int:
+    """
+    Queue refresh jobs for a roster, most stale businesses first.
+
+    Priority is the number of seconds since the last refresh, so businesses
+    that were never processed come before everything else.
+
+    Args:
+        queue: Queue to add the jobs to
+        store: Refresh state used to measure staleness
+        roster: (business_name, address) pairs
+
+    Returns:
+        Number of jobs enqueued
+    """
+    now = time.time()
+    refreshed = store.last_refreshed()
+    for business_name, address in roster:
+        staleness = now - refreshed.get((business_name, address), 0.0)
+        queue.enqueue(business_name, address, options={"refresh": True}, priority=staleness)
+    return len(roster)
+
+
+def select_places_fields(details: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only the Places fields that affect the generated prompt."""
+    fields = {field: details.get(field) for field in PLACES_FIELDS}
+    # The open_now flag flips during the day; only the weekly schedule matters.
+    if isinstance(fields["opening_hours"], dict):
+        fields["opening_hours"] = fields["opening_hours"].get("weekday_text")
+    return fields
+
+
+def diff_places_fields(old: Optional[Dict[str, Any]], new: Dict[str, Any]) -> List[str]:
+    """Return the names of the Places fields that changed."""
+    old = old or {}
+    return [field for field in PLACES_FIELDS if old.get(field) != new.get(field)]
+
+
+def content_fingerprint(markdown: str) -> str:
+    """
+    Fingerprint the meaningful content of a page.
+
+    Link targets, image references and whitespace are dropped before hashing,
+    so rotating tracking parameters or re-flowed templates do not count as
+    content changes.
+
+    Args:
+        markdown: Page markdown from the crawler
+
+    Returns:
+        Hex SHA-256 digest of the reduced markdown
+    """
+    reduced = re.sub(r"!\[[^\]]*\]\([^)]*\)", "", markdown)
+    reduced = re.sub(r"\[([^\]]*)\]\([^)]*\)", r"\1", reduced)
+    reduced = re.sub(r"\s+", " ", reduced).strip().lower()
+    return hashlib.sha256(reduced.encode("utf-8")).hexdigest()
+
+
+def conditional_get(website: str, state: Dict[str, Any]) -> Tuple[Optional[bool], Dict[str, Any]]:
+    """
+    Check a website with a conditional GET using the stored validators.
+
+    Args:
+        website: URL of the website
+        state: Stored state with etag and last_modified, if any
+
+    Returns:
+        (changed, validators): changed is False on 304 Not Modified, True if
+        the server reports new validators, and None if the server sent no
+        validators or the request failed
+    """
+    headers = {}
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+
+    try:
+        with get_scheduler().domain_limiter(website).slot():
+            response = requests.get(website, headers=headers, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException as e:
+        print(f"Conditional GET failed for {website}: {e}")
+        return None, {}
+
+    if response.status_code == 304:
+        return False, {"etag": state.get("etag"), "last_modified": state.get("last_modified")}
+
+    validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    if not any(validators.values()):
+        return None, validators
+    return bool(headers) or None, validators
+
+
+def fetch_sitemap_lastmod(website: str) -> Optional[str]:
+    """
+    Get the most recent lastmod from the website's sitemap.
+
+    Args:
+        website: URL of the website
+
+    Returns:
+        The latest lastmod value, or None if there is no usable sitemap
+    """
+    parsed = urlparse(website)
+    sitemap_url = f"{parsed.scheme}://{parsed.netloc}/sitemap.xml"
+    try:
+        with get_scheduler().domain_limiter(website).slot():
+            response = requests.get(sitemap_url, timeout=REQUEST_TIMEOUT)
+        if response.status_code != 200:
+            return None
+        root = ET.fromstring(response.content)
+    except (requests.RequestException, ET.ParseError):
+        return None
+
+    lastmods = [element.text.strip() for element in root.iter() if element.tag.endswith("lastmod") and element.text]
+    # W3C datetimes of the same precision sort chronologically as strings.
+    return max(lastmods) if lastmods else None
+
+
+def _extraction_succeeded(website_scraped_info: Optional[Dict[str, Any]]) -> bool:
+    """Return True if a website extraction produced data, or found no website to extract."""
+    from src.utils.website_scraper import NO_WEBSITE_ERROR
+
+    if not website_scraped_info:
+        return False
+    if website_scraped_info.get("error"):
+        # No website is a stable state, not a failure to retry.
+        return website_scraped_info["error"] == NO_WEBSITE_ERROR
+    return website_scraped_info.get("websiteData") is not None
+
+
+async def refresh_business(
+    business_name: str,
+    address: str,
+    store: RefreshStore,
+    crawler: Any,
+) -> Dict[str, Any]:
+    """
+    Re-run only the pipeline stages affected by changes since the last refresh.
+
+    A business that was never refreshed goes through the whole pipeline and
+    its state is recorded for the next run.
+
+    Args:
+        business_name: Name of the business
+        address: Address of the business
+        store: Refresh state store
+        crawler: Started AsyncWebCrawler shared by the worker process
+
+    Returns:
+        JSON-serializable result with the detected changes, the stages that
+        ran, the stage outputs and per-stage timings
+
+    Raises:
+        RuntimeError: If the website extraction failed; nothing is stored,
+            so the previous prompts are kept and the job can be retried
+    """
+    # Imported here so that planning a refresh does not need API keys or a
+    # browser installation.
+    from crawl4ai import CacheMode
+    from src.utils.google_maps_scraper import PlaceNotFoundError, find_one_business, get_business_details
+    from src.utils.website_scraper import fetch_website_markdown, scrape_business_website_ai
+    from src.prompts.veo_prompt_generator import veo_prompt_stage1_async, veo_prompt_stage2_async
+
+    state = await asyncio.to_thread(store.get, business_name, address)
+    new_state = dict(state, checked_at=time.time())
+    changes: Dict[str, Any] = {}
+    stages_run: List[str] = []
+    timings: Dict[str, float] = {}
+
+    # Places: look up by stored place ID, falling back to Find Place when
+    # there is none or it has expired.
+    start = time.perf_counter()
+    business = None
+    if state.get("place_id"):
+        try:
+            business = await asyncio.to_thread(get_business_details, state["place_id"])
+        except PlaceNotFoundError as e:
+            print(f"{e}; looking {business_name} up again")
+    if business is None:
+        business = await asyncio.to_thread(find_one_business, business_name, address)
+    timings["places"] = time.perf_counter() - start
+
+    if not business:
+        return {"businessInfo": None, "error": "Business not found", "timings": timings}
+
+    new_state["place_id"] = business.get("place_id")
+    places_fields = select_places_fields(business)
+    changes["places"] = diff_places_fields(state.get("places_fields"), places_fields)
+    new_state["places_fields"] = places_fields
+
+    # Website: cheapest check first, crawl only when it cannot rule out a change.
+    # The new validators and fingerprint are only stored once the extraction
+    # they vouch for has succeeded; storing them after a failed extraction
+    # would make the next refresh see an unchanged site and keep the failure.
+    website = business.get("website")
+    # A website that appeared, disappeared or moved always needs a new extraction.
+    website_changed = website != state.get("website")
+    website_state: Dict[str, Any] = {"website": website}
+    if website:
+        start = time.perf_counter()
+        if website != state.get("website"):
+            # A new URL invalidates every stored validator.
+            state = {key: value for key, value in state.items() if key not in (
+                "etag", "last_modified", "sitemap_lastmod", "content_fingerprint"
+            )}
+            website_state.update(etag=None, last_modified=None, sitemap_lastmod=None, content_fingerprint=None)
+
+        changed, validators = await asyncio.to_thread(conditional_get, website, state)
+        website_state.update(validators)
+        changes["website_check"] = "conditional_get"
+        if changed is None:
+            lastmod = await asyncio.to_thread(fetch_sitemap_lastmod, website)
+            website_state["sitemap_lastmod"] = lastmod
+            changes["website_check"] = "sitemap"
+            if lastmod and state.get("sitemap_lastmod"):
+                changed = lastmod != state["sitemap_lastmod"]
+
+        if changed is not False or not state.get("content_fingerprint"):
+            changes["website_check"] = "fingerprint"
+            markdown = await fetch_website_markdown(website, crawler=crawler)
+            if markdown is not None:
+                fingerprint = content_fingerprint(markdown)
+                website_changed = website_changed or fingerprint != state.get("content_fingerprint")
+                website_state["content_fingerprint"] = fingerprint
+        timings["change_detection"] = time.perf_counter() - start
+    changes["website"] = website_changed
+
+    # Extraction depends on the website; the generation stages depend on the
+    # extraction and the Places fields. A stored extraction that failed is
+    # retried even if the website has not changed.
+    website_scraped_info = state.get("website_scraped_info")
+    if website_changed or not _extraction_succeeded(website_scraped_info):
+        start = time.perf_counter()
+        website_scraped_info = await scrape_business_website_ai(
+            business_name, address, "ai_video",
+            business=business, crawler=crawler, cache_mode=CacheMode.ENABLED,
+        )
+        timings["scrape"] = time.perf_counter() - start
+        if not _extraction_succeeded(website_scraped_info):
+            # Raise rather than generate prompts from the error: the stored
+            # state and prompts stay as they were, and the queue retries.
+            error = (website_scraped_info or {}).get("error") or "no data extracted"
+            raise RuntimeError(f"Website scrape failed: {error}")
+
+        stages_run.append("extraction")
+        # The raw HTML is only needed for this run's prompt, not for the
+        # next refresh.
+        new_state.update(website_state)
+        new_state["website_scraped_info"] = {
+            key: value for key, value in website_scraped_info.items() if key != "rawHtml"
+        }
+    else:
+        website_scraped_info = dict(website_scraped_info, businessInfo=business)
+        new_state.update(website_state)
+        new_state["website_scraped_info"] = website_scraped_info
+
+    if stages_run or changes["places"] or state.get("final_prompt") is None:
+        start = time.perf_counter()
+        prompt1 = await veo_prompt_stage1_async(website_scraped_info)
+        timings["stage1"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        final_prompt = await veo_prompt_stage2_async(prompt1)
+        timings["stage2"] = time.perf_counter() - start
+
+        stages_run.extend(["stage1", "stage2"])
+        new_state.update(stage1_prompt=prompt1, final_prompt=final_prompt, refreshed_at=time.time())
+    else:
+        prompt1 = state.get("stage1_prompt")
+        final_prompt = state.get("final_prompt")
+        new_state["refreshed_at"] = time.time()
+
+    await asyncio.to_thread(store.save, business_name, address, new_state)
+
+    return {
+        "businessInfo": business,
+        "websiteScrapedInfo": website_scraped_info,
+        "changes": changes,
+        "stagesRun": stages_run,
+        "stage1Prompt": prompt1,
+        "finalPrompt": final_prompt,
+        "timings": timings,
+    }
@@ -0,0 +1,333 @@
+"""
+Result Store Module
+
+This module streams batch results into Parquet files with a fixed schema:
+place fields, extraction fields, stage outputs and per-stage timings. Large
+blobs (rendered HTML, the full Places payload) go to a separate
+content-addressed store, and the rows only keep their hashes.
+
+Rows are buffered and written one row group at a time, so memory stays flat
+however many businesses a worker processes. Reads can project just the
+columns they need.
+
+Requires pyarrow.
+
+Author: Localfluence Team
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Union
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+DEFAULT_ROW_GROUP_SIZE = 1000
+DEFAULT_ROWS_PER_FILE = 100000
+
+TIMING_STAGES = ["places", "change_detection", "scrape", "stage1", "stage2"]
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("pyarrow is required for the Parquet result store. Install it with: pip install pyarrow")
+
+
+def result_schema() -> "pa.Schema":
+    """Return the fixed Parquet schema for batch results."""
+    _require_pyarrow()
+    return pa.schema(
+        [
+            ("job_id", pa.int64()),
+            ("business_name", pa.string()),
+            ("address", pa.string()),
+            ("worker_id", pa.string()),
+            ("completed_at", pa.float64()),
+            ("refresh", pa.bool_()),
+            # Places
+            ("place_id", pa.string()),
+            ("place_name", pa.string()),
+            ("formatted_address", pa.string()),
+            ("phone", pa.string()),
+            ("website", pa.string()),
+            ("rating", pa.float64()),
+            ("user_ratings_total", pa.int64()),
+            ("types", pa.list_(pa.string())),
+            # Extraction
+            ("extraction_type", pa.string()),
+            ("extraction_model", pa.string()),
+            ("website_data", pa.string()),
+            # Stage outputs
+            ("stage1_prompt", pa.string()),
+            ("final_prompt", pa.string()),
+            ("stages_run", pa.list_(pa.string())),
+            ("error", pa.string()),
+            # Blob references
+            ("places_payload_ref", pa.string()),
+            ("raw_html_ref", pa.string()),
+            # Timings
+            *[(f"timing_{stage}", pa.float64()) for stage in TIMING_STAGES],
+        ]
+    )
+
+
+class BlobStore:
+    """Content-addressed store for large blobs, gzip-compressed on disk."""
+
+    def __init__(self, root: str):
+        """
+        Args:
+            root: Directory holding the blobs
+        """
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.gz")
+
+    def put(self, content: Union[str, bytes]) -> str:
+        """
+        Store a blob, skipping the write if identical content is already stored.
+
+        Args:
+            content: Blob content; strings are stored as UTF-8
+
+        Returns:
+            The SHA-256 hex digest that addresses the blob
+        """
+        data = content.encode("utf-8") if isinstance(content, str) else content
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if os.path.exists(path):
+            return digest
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write to a uniquely named temporary file and rename, so a reader
+        # never sees a partial blob. Writers of the same content (threads or
+        # processes) each rename a complete copy; whichever lands last wins,
+        # and both are identical.
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{digest}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        """
+        Load a blob.
+
+        Raises:
+            FileNotFoundError: If no blob has this digest
+        """
+        with gzip.open(self._path(digest), "rb") as f:
+            return f.read()
+
+
+def flatten_result(
+    job: Dict[str, Any],
+    worker_id: str,
+    result: Dict[str, Any],
+    blobs: BlobStore,
+    completed_at: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Turn a pipeline or refresh result into a row of the result schema.
+
+    Args:
+        job: Job the result belongs to
+        worker_id: ID of the worker that ran the job
+        result: Result returned by run_pipeline_job or refresh_business
+        blobs: Store for the rendered HTML and the full Places payload
+        completed_at: When the job finished, as a Unix timestamp; defaults
+            to now
+
+    Returns:
+        Row dictionary with the large blobs replaced by their digests
+    """
+    business = result.get("businessInfo") or {}
+    scraped = result.get("websiteScrapedInfo") or {}
+    timings = result.get("timings") or {}
+
+    website_data = scraped.get("websiteData")
+    final_prompt = result.get("finalPrompt")
+    raw_html = scraped.get("rawHtml")
+
+    return {
+        "job_id": job["id"],
+        "business_name": job["business_name"],
+        "address": job["address"],
+        "worker_id": worker_id,
+        "completed_at": time.time() if completed_at is None else completed_at,
+        "refresh": bool(job.get("options", {}).get("refresh")),
+        "place_id": business.get("place_id"),
+        "place_name": business.get("name"),
+        "formatted_address": business.get("formatted_address"),
+        "phone": business.get("formatted_phone_number"),
+        "website": business.get("website"),
+        "rating": business.get("rating"),
+        "user_ratings_total": business.get("user_ratings_total"),
+        "types": business.get("types"),
+        "extraction_type": scraped.get("extractionType"),
+        "extraction_model": scraped.get("extractionModel"),
+        "website_data": json.dumps(website_data) if website_data is not None else None,
+        "stage1_prompt": result.get("stage1Prompt"),
+        "final_prompt": json.dumps(final_prompt) if final_prompt is not None else None,
+        "stages_run": result.get("stagesRun"),
+        "error": result.get("error") or scraped.get("error"),
+        "places_payload_ref": blobs.put(json.dumps(business, sort_keys=True)) if business else None,
+        # Results read back from the queue database were slimmed and only
+        # carry the reference.
+        "raw_html_ref": blobs.put(raw_html) if raw_html else scraped.get("rawHtmlRef"),
+        **{f"timing_{stage}": timings.get(stage) for stage in TIMING_STAGES},
+    }
+
+
+def slim_result(result: Dict[str, Any], row: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a copy of a result with the rendered HTML replaced by its blob reference."""
+    scraped = result.get("websiteScrapedInfo")
+    if not scraped or "rawHtml" not in scraped:
+        return result
+    scraped = {key: value for key, value in scraped.items() if key != "rawHtml"}
+    scraped["rawHtmlRef"] = row["raw_html_ref"]
+    return dict(result, websiteScrapedInfo=scraped)
+
+
+class ResultSink:
+    """
+    Streams result rows into Parquet part files in a directory.
+
+    Rows are flushed as one row group every `row_group_size` rows, and a new
+    part file is started every `rows_per_file` rows. Part files are written
+    under a temporary name and renamed when closed, so readers only ever see
+    complete files.
+
+    A sink can be shared by threads, e.g. asyncio.to_thread calls from
+    concurrent jobs of one worker.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        prefix: str,
+        row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+        rows_per_file: int = DEFAULT_ROWS_PER_FILE,
+    ):
+        """
+        Args:
+            directory: Directory for the part files
+            prefix: Unique file name prefix, e.g. the worker ID
+            row_group_size: Rows buffered in memory before each flush
+            rows_per_file: Rows written before starting a new part file
+
+        Raises:
+            ImportError: If pyarrow is not installed
+        """
+        _require_pyarrow()
+        self.directory = directory
+        self.prefix = prefix
+        self.row_group_size = row_group_size
+        self.rows_per_file = rows_per_file
+        self.schema = result_schema()
+
+        self._rows: List[Dict[str, Any]] = []
+        self._writer: Optional["pq.ParquetWriter"] = None
+        self._path: Optional[str] = None
+        self._rows_in_file = 0
+        self._part = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def __enter__(self) -> "ResultSink":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def write(self, row: Dict[str, Any]) -> None:
+        """Buffer a row, flushing a row group once the buffer is full."""
+        with self._lock:
+            self._rows.append(row)
+            if len(self._rows) >= self.row_group_size:
+                self._flush()
+
+    def flush(self) -> None:
+        """Write the buffered rows as a row group."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._rows:
+            return
+
+        if self._writer is None:
+            self._path = os.path.join(self.directory, f"{self.prefix}-{self._part:05d}.parquet")
+            self._writer = pq.ParquetWriter(f"{self._path}.tmp", self.schema, compression="zstd")
+
+        self._writer.write_table(pa.Table.from_pylist(self._rows, schema=self.schema))
+        self._rows_in_file += len(self._rows)
+        self._rows = []
+
+        if self._rows_in_file >= self.rows_per_file:
+            self._close_file()
+
+    def _close_file(self) -> None:
+        if self._writer is None:
+            return
+        self._writer.close()
+        os.replace(f"{self._path}.tmp", self._path)
+        self._writer = None
+        self._rows_in_file = 0
+        self._part += 1
+
+    def close(self) -> None:
+        """Flush the remaining rows and finish the current part file."""
+        with self._lock:
+            self._flush()
+            self._close_file()
+
+
+def read_results(
+    directory: str,
+    columns: Optional[List[str]] = None,
+    filters: Optional[List[Any]] = None,
+) -> "pa.Table":
+    """
+    Read results from a directory of part files.
+
+    Only the requested columns are read from disk, and filters are pushed
+    down to skip row groups that cannot match.
+
+    Args:
+        directory: Directory written by ResultSink
+        columns: Columns to read (all columns if omitted)
+        filters: pyarrow filters, e.g. [("extraction_model", "=", "groq-deepseek-r1")]
+
+    Returns:
+        The matching rows as a pyarrow Table
+
+    Raises:
+        ImportError: If pyarrow is not installed
+    """
+    _require_pyarrow()
+    paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".parquet")
+    )
+    if not paths:
+        return result_schema().empty_table().select(columns or result_schema().names)
+    return pq.ParquetDataset(paths, filters=filters).read(columns=columns)
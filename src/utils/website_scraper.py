@@ -9,6 +9,7 @@ Author: Localfluence Team
 """
 
 import json
+import re
 import asyncio
 from typing import List, Dict, Optional, Any
 
@@ -17,12 +18,190 @@ from crawl4ai import (
     BrowserConfig,
     CacheMode,
     CrawlerRunConfig,
-    LLMExtractionStrategy,
-    LLMConfig,
 )
 
 from src.utils.google_maps_scraper import find_one_business
-from src.config import get_groq_api_key
+from src.utils.model_router import get_model_router, get_route_client
+from src.utils.rate_controller import get_scheduler, is_throttle_message
+
+
+# Error reported for a business without a website. Unlike other scrape
+# errors it is a stable state, not a failure worth retrying.
+NO_WEBSITE_ERROR = 'No website available'
+
+# Schemas and instructions for the two kinds of LLM extraction.
+BUSINESS_INFO_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "business_name": {
+            "type": "string", 
+            "description": "Full business name"
+        },
+        "description": {
+            "type": "string", 
+            "description": "Brief description of the business"
+        },
+        "keywords": {
+            "type": "array", 
+            "items": {"type": "string"}, 
+            "description": "Relevant keywords for SEO and business categorization"
+        },
+        "services_offered": {
+            "type": "array", 
+            "items": {"type": "string"}, 
+            "description": "List of services or products offered"
+        },
+        "business_hours": {
+            "type": "string", 
+            "description": "Operating hours if found"
+        },
+        "contact_information": {
+            "type": "object",
+            "properties": {
+                "phone": {"type": "array", "items": {"type": "string"}},
+                "email": {"type": "array", "items": {"type": "string"}},
+                "address": {"type": "string"}
+            }
+        },
+        "social_media": {
+            "type": "object",
+            "properties": {
+                "facebook": {"type": "string"},
+                "twitter": {"type": "string"},
+                "instagram": {"type": "string"},
+                "linkedin": {"type": "string"},
+                "youtube": {"type": "string"}
+            }
+        },
+        "special_features": {
+            "type": "array", 
+            "items": {"type": "string"}, 
+            "description": "Special features, amenities, or unique selling points"
+        },
+        "target_audience": {
+            "type": "string", 
+            "description": "Who this business serves"
+        },
+        "price_range": {
+            "type": "string", 
+            "description": "Price range if mentioned (e.g., $, $$, $$$)"
+        },
+        "business_type": {
+            "type": "string", 
+            "description": "Type of business (restaurant, retail, service, etc.)"
+        },
+        "location_features": {
+            "type": "array", 
+            "items": {"type": "string"}, 
+            "description": "Location-specific features (parking, accessibility, etc.)"
+        },
+        "additional_notes": {
+            "type": "string", 
+            "description": "Any other relevant information"
+        }
+    },
+    "required": ["business_name", "description", "keywords"]
+}
+
+BUSINESS_INFO_INSTRUCTION = (
+    "Extract comprehensive business information from this website. Focus on identifying "
+    "keywords that would be useful for SEO, local search, and business categorization. "
+    "Include all relevant services, features, and contact information. Be thorough but "
+    "accurate in your extraction."
+)
+
+AI_VIDEO_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "business_identity": {
+            "type": "object",
+            "properties": {
+                "brand_name": {"type": "string", "description": "Business/brand name"},
+                "brand_story": {"type": "string", "description": "Compelling brand story and mission"},
+                "unique_selling_points": {"type": "array", "items": {"type": "string"}, "description": "What makes this business unique"},
+                "brand_values": {"type": "array", "items": {"type": "string"}, "description": "Core brand values and personality"}
+            },
+            "description": "Core business identity and brand information"
+        },
+        "visual_elements": {
+            "type": "object",
+            "properties": {
+                "primary_products": {"type": "array", "items": {"type": "string"}, "description": "Main products or services to feature"},
+                "visual_style": {"type": "string", "description": "Desired visual aesthetic (e.g., modern, rustic, luxury, minimalist)"},
+                "color_palette": {"type": "array", "items": {"type": "string"}, "description": "Brand colors and visual themes"},
+                "environmental_elements": {"type": "array", "items": {"type": "string"}, "description": "Physical environment elements (interior, exterior, props)"},
+                "texture_materials": {"type": "array", "items": {"type": "string"}, "description": "Materials and textures to feature"}
+            },
+            "description": "Visual elements for video creation"
+        },
+        "target_audience": {
+            "type": "object",
+            "properties": {
+                "demographics": {"type": "array", "items": {"type": "string"}},
+                "interests": {"type": "array", "items": {"type": "string"}},
+                "lifestyle": {"type": "array", "items": {"type": "string"}},
+                "emotional_triggers": {"type": "array", "items": {"type": "string"}, "description": "Emotions to evoke in the audience"}
+            },
+            "description": "Target audience insights for video messaging"
+        },
+        "video_concepts": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "concept_name": {"type": "string", "description": "Name of the video concept"},
+                    "description": {"type": "string", "description": "Detailed description of the video scene"},
+                    "style": {"type": "string", "description": "Visual style (cinematic, photorealistic, etc.)"},
+                    "camera": {"type": "string", "description": "Camera movement and positioning"},
+                    "lighting": {"type": "string", "description": "Lighting setup and mood"},
+                    "environment": {"type": "string", "description": "Setting and location"},
+                    "elements": {"type": "array", "items": {"type": "string"}, "description": "Key visual elements to include"},
+                    "motion": {"type": "string", "description": "Movement and animation description"},
+                    "ending": {"type": "string", "description": "How the video should conclude"},
+                    "text": {"type": "string", "description": "Text overlays or call-to-action"},
+                    "keywords": {"type": "array", "items": {"type": "string"}, "description": "Keywords for AI video generation"}
+                }
+            },
+            "description": "Multiple video concept ideas for Google Veo 3"
+        },
+        "brand_assets": {
+            "type": "object",
+            "properties": {
+                "logo_description": {"type": "string", "description": "How to incorporate the brand logo"},
+                "tagline": {"type": "string", "description": "Brand tagline or slogan"},
+                "signature_elements": {"type": "array", "items": {"type": "string"}, "description": "Signature brand elements to feature"}
+            },
+            "description": "Brand assets to incorporate in videos"
+        },
+        "call_to_action": {
+            "type": "object",
+            "properties": {
+                "primary_cta": {"type": "string", "description": "Main call-to-action message"},
+                "secondary_cta": {"type": "string", "description": "Secondary call-to-action options"},
+                "contact_info": {"type": "string", "description": "How to display contact information"}
+            },
+            "description": "Call-to-action elements for video"
+        },
+        "technical_specs": {
+            "type": "object",
+            "properties": {
+                "aspect_ratio": {"type": "string", "description": "Video aspect ratio (16:9, 9:16, etc.)"},
+                "duration": {"type": "string", "description": "Target video duration"},
+                "quality": {"type": "string", "description": "Desired video quality level"}
+            },
+            "description": "Technical specifications for video generation"
+        }
+    },
+    "required": ["business_identity", "visual_elements", "target_audience", "video_concepts"]
+}
+
+AI_VIDEO_INSTRUCTION = (
+    "Extract comprehensive business information to create AI marketing video prompts for Google Veo 3. "
+    "Focus on identifying visual elements, brand identity, target audience, and creating multiple video concepts. "
+    "Each video concept should be detailed enough to generate a complete Google Veo 3 prompt with description, "
+    "style, camera, lighting, elements, motion, and keywords. Be creative and thorough in identifying "
+    "all potential video angles and opportunities that showcase the business effectively."
+)
 
 
 def get_browser_config() -> BrowserConfig:
@@ -39,239 +218,130 @@ def get_browser_config() -> BrowserConfig:
     )
 
 
-def get_business_extraction_strategy() -> LLMExtractionStrategy:
+def parse_extraction_reply(reply: Optional[str]) -> Any:
     """
-    Get the LLM extraction strategy for general business information.
-    
+    Parse the JSON object in an extraction model's reply.
+
+    Reasoning models (e.g. DeepSeek R1) think out loud before answering, and
+    some models wrap their JSON in a Markdown code block; both are removed.
+
+    Args:
+        reply: Raw text of the model's reply
+
     Returns:
-        LLMExtractionStrategy: Configuration for extracting business data
-        
+        The parsed JSON value
+
     Raises:
-        ValueError: If GROQ_API_KEY is not configured
+        json.JSONDecodeError: If the reply holds no valid JSON
     """
-    try:
-        groq_api_key = get_groq_api_key()
-    except ValueError:
-        raise ValueError("GROQ_API_KEY not found. Please set it in your .env file.")
-    
-    return LLMExtractionStrategy(
-        llm_config=LLMConfig(
-            provider="groq/deepseek-r1-distill-llama-70b",
-            api_token=groq_api_key,
-        ),
-        schema={
-            "type": "object",
-            "properties": {
-                "business_name": {
-                    "type": "string", 
-                    "description": "Full business name"
-                },
-                "description": {
-                    "type": "string", 
-                    "description": "Brief description of the business"
-                },
-                "keywords": {
-                    "type": "array", 
-                    "items": {"type": "string"}, 
-                    "description": "Relevant keywords for SEO and business categorization"
-                },
-                "services_offered": {
-                    "type": "array", 
-                    "items": {"type": "string"}, 
-                    "description": "List of services or products offered"
-                },
-                "business_hours": {
-                    "type": "string", 
-                    "description": "Operating hours if found"
-                },
-                "contact_information": {
-                    "type": "object",
-                    "properties": {
-                        "phone": {"type": "array", "items": {"type": "string"}},
-                        "email": {"type": "array", "items": {"type": "string"}},
-                        "address": {"type": "string"}
-                    }
-                },
-                "social_media": {
-                    "type": "object",
-                    "properties": {
-                        "facebook": {"type": "string"},
-                        "twitter": {"type": "string"},
-                        "instagram": {"type": "string"},
-                        "linkedin": {"type": "string"},
-                        "youtube": {"type": "string"}
-                    }
-                },
-                "special_features": {
-                    "type": "array", 
-                    "items": {"type": "string"}, 
-                    "description": "Special features, amenities, or unique selling points"
-                },
-                "target_audience": {
-                    "type": "string", 
-                    "description": "Who this business serves"
-                },
-                "price_range": {
-                    "type": "string", 
-                    "description": "Price range if mentioned (e.g., $, $$, $$$)"
-                },
-                "business_type": {
-                    "type": "string", 
-                    "description": "Type of business (restaurant, retail, service, etc.)"
-                },
-                "location_features": {
-                    "type": "array", 
-                    "items": {"type": "string"}, 
-                    "description": "Location-specific features (parking, accessibility, etc.)"
-                },
-                "additional_notes": {
-                    "type": "string", 
-                    "description": "Any other relevant information"
-                }
-            },
-            "required": ["business_name", "description", "keywords"]
-        },
-        extraction_type="schema",
-        instruction=(
-            "Extract comprehensive business information from this website. Focus on identifying "
-            "keywords that would be useful for SEO, local search, and business categorization. "
-            "Include all relevant services, features, and contact information. Be thorough but "
-            "accurate in your extraction."
-        ),
-        input_format="markdown",
-        verbose=False,
+    reply = re.sub(r"<think>.*?</think>", "", reply or "", flags=re.DOTALL).strip()
+    reply = re.sub(r"^```(?:json)?\s*|\s*```$", "", reply)
+    return json.loads(reply)
+
+
+async def _fetch_page(
+    crawler: AsyncWebCrawler,
+    website: str,
+    cache_mode: CacheMode,
+    session_id: Optional[str] = None,
+):
+    # Fetch and render the page without extraction, holding the crawl slot
+    # and a politeness slot for the domain.
+    scheduler = get_scheduler()
+    async with scheduler.domain_limiter(website).aslot() as domain_slot, \
+            scheduler.aslot("crawl") as crawl_slot:
+        result = await crawler.arun(
+            url=website,
+            config=CrawlerRunConfig(cache_mode=cache_mode, session_id=session_id),
+        )
+        if not result.success:
+            # A timeout or 503 says the site is struggling, not that we crawl
+            # too much overall; only its domain backs off.
+            if is_throttle_message(result.error_message):
+                domain_slot.mark_throttled()
+            else:
+                domain_slot.mark_error()
+            crawl_slot.mark_error()
+    return result
+
+
+async def _extract_with_route(markdown: str, extraction_type: str, route: Dict[str, Any]) -> List[Any]:
+    # Calls the model directly on the fetched markdown rather than through
+    # crawl4ai, whose LLM call blocks inside arun: a plain coroutine lets the
+    # model router hedge, cancel and fail over.
+    if extraction_type == "full":
+        schema, instruction = BUSINESS_INFO_SCHEMA, BUSINESS_INFO_INSTRUCTION
+    else:
+        schema, instruction = AI_VIDEO_SCHEMA, AI_VIDEO_INSTRUCTION
+
+    system_prompt = (
+        f"{instruction}\n\nReply with a single JSON object that follows this JSON schema, "
+        f"and nothing else:\n{json.dumps(schema)}"
+    )
+    response = await get_route_client(route).chat.completions.create(
+        model=route["model"],
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": markdown[:route.get("max_input_chars")]},
+        ],
     )
 
+    # A reply that is not valid JSON raises here, so the router fails over.
+    # The result keeps the shape of crawl4ai's schema extraction: a list of
+    # extracted blocks.
+    return [parse_extraction_reply(response.choices[0].message.content)]
 
-def get_ai_video_content_strategy() -> LLMExtractionStrategy:
+
+async def fetch_website_markdown(
+    website: str,
+    crawler: Optional[AsyncWebCrawler] = None,
+) -> Optional[str]:
     """
-    Get the LLM extraction strategy for AI marketing video content.
-    
+    Fetch a website and convert it to markdown without running the LLM extraction.
+
+    The page is written to the crawl4ai cache, so a following
+    scrape_business_website_ai call with CacheMode.ENABLED does not fetch it again.
+
+    Args:
+        website: URL of the website
+        crawler: Started crawler to reuse; a new one is created if omitted
+
     Returns:
-        LLMExtractionStrategy: Configuration for extracting data to create Google Veo 3 video prompts
-        
-    Raises:
-        ValueError: If GROQ_API_KEY is not configured
+        The page as markdown, or None if the crawl failed
     """
-    try:
-        groq_api_key = get_groq_api_key()
-    except ValueError:
-        raise ValueError("GROQ_API_KEY not found. Please set it in your .env file.")
-    
-    return LLMExtractionStrategy(
-        llm_config=LLMConfig(
-            provider="groq/deepseek-r1-distill-llama-70b",
-            api_token=groq_api_key,
-        ),
-        schema={
-            "type": "object",
-            "properties": {
-                "business_identity": {
-                    "type": "object",
-                    "properties": {
-                        "brand_name": {"type": "string", "description": "Business/brand name"},
-                        "brand_story": {"type": "string", "description": "Compelling brand story and mission"},
-                        "unique_selling_points": {"type": "array", "items": {"type": "string"}, "description": "What makes this business unique"},
-                        "brand_values": {"type": "array", "items": {"type": "string"}, "description": "Core brand values and personality"}
-                    },
-                    "description": "Core business identity and brand information"
-                },
-                "visual_elements": {
-                    "type": "object",
-                    "properties": {
-                        "primary_products": {"type": "array", "items": {"type": "string"}, "description": "Main products or services to feature"},
-                        "visual_style": {"type": "string", "description": "Desired visual aesthetic (e.g., modern, rustic, luxury, minimalist)"},
-                        "color_palette": {"type": "array", "items": {"type": "string"}, "description": "Brand colors and visual themes"},
-                        "environmental_elements": {"type": "array", "items": {"type": "string"}, "description": "Physical environment elements (interior, exterior, props)"},
-                        "texture_materials": {"type": "array", "items": {"type": "string"}, "description": "Materials and textures to feature"}
-                    },
-                    "description": "Visual elements for video creation"
-                },
-                "target_audience": {
-                    "type": "object",
-                    "properties": {
-                        "demographics": {"type": "array", "items": {"type": "string"}},
-                        "interests": {"type": "array", "items": {"type": "string"}},
-                        "lifestyle": {"type": "array", "items": {"type": "string"}},
-                        "emotional_triggers": {"type": "array", "items": {"type": "string"}, "description": "Emotions to evoke in the audience"}
-                    },
-                    "description": "Target audience insights for video messaging"
-                },
-                "video_concepts": {
-                    "type": "array",
-                    "items": {
-                        "type": "object",
-                        "properties": {
-                            "concept_name": {"type": "string", "description": "Name of the video concept"},
-                            "description": {"type": "string", "description": "Detailed description of the video scene"},
-                            "style": {"type": "string", "description": "Visual style (cinematic, photorealistic, etc.)"},
-                            "camera": {"type": "string", "description": "Camera movement and positioning"},
-                            "lighting": {"type": "string", "description": "Lighting setup and mood"},
-                            "environment": {"type": "string", "description": "Setting and location"},
-                            "elements": {"type": "array", "items": {"type": "string"}, "description": "Key visual elements to include"},
-                            "motion": {"type": "string", "description": "Movement and animation description"},
-                            "ending": {"type": "string", "description": "How the video should conclude"},
-                            "text": {"type": "string", "description": "Text overlays or call-to-action"},
-                            "keywords": {"type": "array", "items": {"type": "string"}, "description": "Keywords for AI video generation"}
-                        }
-                    },
-                    "description": "Multiple video concept ideas for Google Veo 3"
-                },
-                "brand_assets": {
-                    "type": "object",
-                    "properties": {
-                        "logo_description": {"type": "string", "description": "How to incorporate the brand logo"},
-                        "tagline": {"type": "string", "description": "Brand tagline or slogan"},
-                        "signature_elements": {"type": "array", "items": {"type": "string"}, "description": "Signature brand elements to feature"}
-                    },
-                    "description": "Brand assets to incorporate in videos"
-                },
-                "call_to_action": {
-                    "type": "object",
-                    "properties": {
-                        "primary_cta": {"type": "string", "description": "Main call-to-action message"},
-                        "secondary_cta": {"type": "string", "description": "Secondary call-to-action options"},
-                        "contact_info": {"type": "string", "description": "How to display contact information"}
-                    },
-                    "description": "Call-to-action elements for video"
-                },
-                "technical_specs": {
-                    "type": "object",
-                    "properties": {
-                        "aspect_ratio": {"type": "string", "description": "Video aspect ratio (16:9, 9:16, etc.)"},
-                        "duration": {"type": "string", "description": "Target video duration"},
-                        "quality": {"type": "string", "description": "Desired video quality level"}
-                    },
-                    "description": "Technical specifications for video generation"
-                }
-            },
-            "required": ["business_identity", "visual_elements", "target_audience", "video_concepts"]
-        },
-        extraction_type="schema",
-        instruction=(
-            "Extract comprehensive business information to create AI marketing video prompts for Google Veo 3. "
-            "Focus on identifying visual elements, brand identity, target audience, and creating multiple video concepts. "
-            "Each video concept should be detailed enough to generate a complete Google Veo 3 prompt with description, "
-            "style, camera, lighting, elements, motion, and keywords. Be creative and thorough in identifying "
-            "all potential video angles and opportunities that showcase the business effectively."
-        ),
-        input_format="markdown",
-        verbose=False,
-    )
+    if crawler is None:
+        crawler = AsyncWebCrawler()
+
+    result = await _fetch_page(crawler, website, CacheMode.WRITE_ONLY)
+    if not result.success:
+        print(f"Failed to fetch website: {result.error_message}")
+        return None
+
+    return str(result.markdown or "")
 
 
 async def scrape_business_website_ai(
     business_name: str, 
     business_address: str,
-    extraction_type: str = "ai_video"
+    extraction_type: str = "ai_video",
+    business: Optional[Dict[str, Any]] = None,
+    crawler: Optional[AsyncWebCrawler] = None,
+    cache_mode: CacheMode = CacheMode.BYPASS,
 ) -> Optional[Dict[str, Any]]:
     """
     Scrape a business website using AI to extract structured information.
     
+    The page is fetched once and its markdown goes straight to the
+    extraction model; the markdown size picks the model, and the model
+    router hedges or fails over to another model on the same markdown.
+    
     Args:
         business_name: Name of the business
         business_address: Address of the business
         extraction_type: Type of extraction - "full" for complete business info, "influencer" for influencer content, "ai_video" for AI video prompts
+        business: Business details already looked up with find_one_business, to skip a second Places lookup
+        crawler: Started crawler to reuse (e.g. one per batch worker); a new one is created if omitted
+        cache_mode: crawl4ai cache mode for the page fetch; CacheMode.ENABLED reuses a page fetched by fetch_website_markdown
         
     Returns:
         Dictionary containing extracted business information or None if failed
@@ -285,8 +355,9 @@ async def scrape_business_website_ai(
     
     try:
         # Find the business using Google Places API
-        print(f"Finding business: {business_name}")
-        business = find_one_business(business_name, business_address)
+        if business is None:
+            print(f"Finding business: {business_name}")
+            business = find_one_business(business_name, business_address)
         
         if not business:
             print(f"Business not found: {business_name}")
@@ -298,41 +369,33 @@ async def scrape_business_website_ai(
             return {
                 'businessInfo': business,
                 'websiteData': None,
-                'error': 'No website available'
+                'error': NO_WEBSITE_ERROR
             }
         
         print(f"Found website: {website}")
         
         # Initialize the crawler
-        crawler = AsyncWebCrawler()
-        
-        # Choose extraction strategy based on type
-        if extraction_type == "influencer":
-            strategy = get_ai_video_content_strategy()
-        elif extraction_type == "ai_video":
-            strategy = get_ai_video_content_strategy()
-        else:
-            strategy = get_business_extraction_strategy()
+        if crawler is None:
+            crawler = AsyncWebCrawler()
         
-        # Scrape the website
-        result = await crawler.arun(
-            url=website,
-            config=CrawlerRunConfig(
-                cache_mode=CacheMode.BYPASS,
-                extraction_strategy=strategy,
-                session_id=f"business_{business_name.replace(' ', '_')}",
-            ),
+        # Fetch the page
+        page = await _fetch_page(
+            crawler,
+            website,
+            cache_mode,
+            session_id=f"business_{business_name.replace(' ', '_')}",
         )
         
-        if not result.success:
-            print(f"Failed to scrape website: {result.error_message}")
+        if not page.success:
+            print(f"Failed to scrape website: {page.error_message}")
             return {
                 'businessInfo': business,
                 'websiteData': None,
-                'error': result.error_message
+                'error': page.error_message
             }
         
-        if not result.extracted_content:
+        markdown = str(page.markdown or "")
+        if not markdown.strip():
             print("No content extracted from website")
             return {
                 'businessInfo': business,
@@ -340,29 +403,25 @@ async def scrape_business_website_ai(
                 'error': 'No content extracted'
             }
         
-        # Parse the extracted content
-        try:
-            extracted_data = json.loads(result.extracted_content)
-        except json.JSONDecodeError as e:
-            print(f"Failed to parse extracted content: {e}")
-            return {
-                'businessInfo': business,
-                'websiteData': None,
-                'error': f'JSON parsing error: {str(e)}',
-                'rawContent': result.extracted_content
-            }
+        # Extract with the model router, which picks a model by page size
+        route, extracted_data = await get_model_router().call(
+            "extraction",
+            len(markdown),
+            lambda route: _extract_with_route(markdown, extraction_type, route),
+        )
         
         return {
             'businessInfo': business,
             'websiteData': extracted_data,
-            'rawHtml': result.cleaned_html,
-            'extractionType': extraction_type
+            'rawHtml': page.cleaned_html,
+            'extractionType': extraction_type,
+            'extractionModel': route['name']
         }
         
     except Exception as e:
         print(f"Error during scraping: {e}")
         return {
-            'businessInfo': business if 'business' in locals() else None,
+            'businessInfo': business,
             'websiteData': None,
             'error': str(e)
         }
@@ -0,0 +1,332 @@
+"""
+Work Queue Module
+
+This module provides a SQLite-backed work queue shared by batch workers. Jobs
+are leased to a worker for a limited time; workers extend their leases with
+heartbeats, and jobs whose lease expires (because the worker died) are put
+back on the queue for another worker to pick up.
+
+The database file can live on local disk (multiple processes on one host) or
+in a shared directory that several hosts mount. WAL journaling is only
+enabled for queues marked local-only, because it relies on shared memory
+that does not work across hosts.
+
+Author: Localfluence Team
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    business_name TEXT NOT NULL,
+    address TEXT NOT NULL,
+    options TEXT NOT NULL DEFAULT '{}',
+    priority REAL NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker_id TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    enqueued_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, priority, id);
+
+CREATE TABLE IF NOT EXISTS results (
+    job_id INTEGER PRIMARY KEY,
+    business_name TEXT NOT NULL,
+    address TEXT NOT NULL,
+    worker_id TEXT NOT NULL,
+    result TEXT NOT NULL,
+    completed_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    hostname TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    last_heartbeat REAL NOT NULL,
+    metrics TEXT NOT NULL DEFAULT '{}'
+);
+"""
+
+
+def make_worker_id(index: int = 0) -> str:
+    """Build a worker ID that is unique across hosts and processes."""
+    return f"{socket.gethostname()}-{os.getpid()}-{index}"
+
+
+class WorkQueue:
+    """
+    Leased job queue backed by a single SQLite database file.
+
+    Every operation opens its own short-lived connection so the queue can be
+    used from worker threads, worker processes and other hosts alike.
+    """
+
+    def __init__(self, db_path: str, busy_timeout: float = 30.0, local_only: bool = False):
+        """
+        Open (and create if needed) the queue database.
+
+        Args:
+            db_path: Path to the SQLite database file
+            busy_timeout: Seconds to wait for a lock held by another worker
+            local_only: Switch the database to WAL journaling; only safe when
+                every worker runs on the host that owns the database file. A
+                new database otherwise uses SQLite's rollback journal
+        """
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.local_only = local_only
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            # WAL lets readers run while a worker holds the write lock, but
+            # its shared-memory index breaks locking on network filesystems,
+            # so it is only switched on when asked for. Otherwise the stored
+            # journal mode is left alone: switching a WAL database back needs
+            # exclusive access and would fail while a local-only run is active.
+            if local_only:
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # BEGIN IMMEDIATE takes the write lock up front so two workers can
+        # never lease the same job.
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def enqueue(
+        self,
+        business_name: str,
+        address: str,
+        options: Optional[Dict[str, Any]] = None,
+        priority: float = 0.0,
+    ) -> int:
+        """
+        Add a business to the queue.
+
+        Args:
+            business_name: Name of the business
+            address: Address of the business
+            options: Extra job options passed through to the worker
+            priority: Jobs with a higher priority are leased first
+
+        Returns:
+            The ID of the new job
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (business_name, address, options, priority, enqueued_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (business_name, address, json.dumps(options or {}), priority, now, now),
+            )
+            return cursor.lastrowid
+
+    def requeue_expired(self, max_attempts: int, conn: Optional[sqlite3.Connection] = None) -> int:
+        """
+        Put jobs whose lease has expired back on the queue.
+
+        A job that has already used up its attempts is marked as failed
+        instead, so a business that crashes every worker that takes it does
+        not loop forever.
+
+        Args:
+            max_attempts: Attempts after which the job is marked as failed
+            conn: Connection with an open transaction to reuse, if any
+
+        Returns:
+            Number of expired leases released
+        """
+        if conn is None:
+            with self._transaction() as conn:
+                return self.requeue_expired(max_attempts, conn)
+
+        now = time.time()
+        cursor = conn.execute(
+            "UPDATE jobs SET "
+            "status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "worker_id = NULL, lease_expires = NULL, error = 'lease expired', updated_at = ? "
+            "WHERE status = 'leased' AND lease_expires < ?",
+            (max_attempts, now, now),
+        )
+        return cursor.rowcount
+
+    def lease(self, worker_id: str, lease_seconds: float, max_attempts: int) -> Optional[Dict[str, Any]]:
+        """
+        Lease the next pending job to a worker.
+
+        Expired leases are re-queued first, so a job held by a dead worker is
+        picked up by the next worker that asks for work.
+
+        Args:
+            worker_id: ID of the worker taking the job
+            lease_seconds: How long the lease lasts without a heartbeat
+            max_attempts: Attempts after which an expired job is marked as failed
+
+        Returns:
+            The leased job as a dictionary, or None if the queue is empty
+        """
+        with self._transaction() as conn:
+            self.requeue_expired(max_attempts, conn)
+
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'pending' "
+                "ORDER BY priority DESC, id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'leased', worker_id = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (worker_id, now + lease_seconds, now, row["id"]),
+            )
+
+        job = dict(row)
+        job["options"] = json.loads(job["options"])
+        job["attempts"] += 1
+        return job
+
+    def heartbeat(
+        self,
+        worker_id: str,
+        lease_seconds: float,
+        metrics: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Extend the leases of every job held by a worker and record it as alive.
+
+        Args:
+            worker_id: ID of the worker
+            lease_seconds: New lease length, counted from now
+            metrics: Optional worker metrics to publish alongside the heartbeat
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE status = 'leased' AND worker_id = ?",
+                (now + lease_seconds, worker_id),
+            )
+            conn.execute(
+                "INSERT INTO workers (worker_id, hostname, pid, started_at, last_heartbeat, metrics) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(worker_id) DO UPDATE SET last_heartbeat = excluded.last_heartbeat, "
+                "metrics = excluded.metrics",
+                (worker_id, socket.gethostname(), os.getpid(), now, now, json.dumps(metrics or {})),
+            )
+
+    def complete(self, job_id: int, worker_id: str, result: Dict[str, Any]) -> bool:
+        """
+        Mark a job as done and store its result.
+
+        Args:
+            job_id: ID of the job
+            worker_id: ID of the worker that ran it
+            result: JSON-serializable pipeline result
+
+        Returns:
+            False if the worker no longer held the lease (the job was
+            re-queued and the result is discarded), True otherwise
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'done', lease_expires = NULL, error = NULL, updated_at = ? "
+                "WHERE id = ? AND status = 'leased' AND worker_id = ?",
+                (now, job_id, worker_id),
+            )
+            if cursor.rowcount == 0:
+                return False
+
+            job = conn.execute(
+                "SELECT business_name, address FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO results (job_id, business_name, address, worker_id, result, completed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, job["business_name"], job["address"], worker_id, json.dumps(result, default=str), now),
+            )
+            return True
+
+    def fail(self, job_id: int, worker_id: str, error: str, max_attempts: int) -> None:
+        """
+        Record a failed attempt, re-queueing the job until it runs out of attempts.
+
+        Args:
+            job_id: ID of the job
+            worker_id: ID of the worker that ran it
+            error: Error message to record
+            max_attempts: Attempts after which the job is marked as failed
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET "
+                "status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "worker_id = NULL, lease_expires = NULL, error = ?, updated_at = ? "
+                "WHERE id = ? AND status = 'leased' AND worker_id = ?",
+                (max_attempts, error, time.time(), job_id, worker_id),
+            )
+
+    def has_unfinished(self) -> bool:
+        """Return True while any job is pending or leased."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM jobs WHERE status IN ('pending', 'leased') LIMIT 1"
+            ).fetchone()
+            return row is not None
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of jobs in each status."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+            return {row["status"]: row["n"] for row in rows}
+
+    def workers(self) -> List[Dict[str, Any]]:
+        """Return every worker that has sent a heartbeat, most recent first."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM workers ORDER BY last_heartbeat DESC").fetchall()
+
+        workers = []
+        for row in rows:
+            worker = dict(row)
+            worker["metrics"] = json.loads(worker["metrics"])
+            workers.append(worker)
+        return workers
+
+    def results(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over stored results in completion order."""
+        with self._connect() as conn:
+            for row in conn.execute("SELECT * FROM results ORDER BY completed_at"):
+                result = dict(row)
+                result["result"] = json.loads(result["result"])
+                yield result
@@ -0,0 +1,66 @@
+"""
+Tests for the local place index.
+
+Author: Localfluence Team
+"""
+
+import pytest
+
+from src.utils.place_resolver import PlaceResolver, parse_street
+
+
+@pytest.fixture
+def resolver(tmp_path):
+    resolver = PlaceResolver(str(tmp_path / "place_index.db"))
+    resolver.add("subway-east", "Subway", "123 E Main St, Mesa, AZ 85201, USA")
+    resolver.add("cafe-north", "Corner Cafe", "55 N 1st Ave, Mesa, AZ 85201, USA")
+    resolver.add("starbucks-ny", "Starbucks", "123 Main St, New York, NY 10001, USA")
+    resolver.add("matcha", "Matcha Magic", "50 Elm St, Auburn, AL 36830, USA")
+    resolver.add("hamiltons", "Hamilton's", "174 E Magnolia Ave, Auburn, AL 36830, USA")
+    return resolver
+
+
+@pytest.mark.parametrize(
+    "name, address, place_id",
+    [
+        ("Subway", "123 E Main St, Mesa, AZ 85201", "subway-east"),
+        ("Subway", "123 East Main Street, Mesa AZ 85201", "subway-east"),
+        ("Corner Cafe", "55 North 1st Avenue, Mesa, AZ", "cafe-north"),
+        ("Hamiltons", "174 East Magnolia Avenue, Auburn AL 36830", "hamiltons"),
+    ],
+)
+def test_resolves_spelling_variants(resolver, name, address, place_id):
+    assert resolver.resolve(name, address) == place_id
+
+
+@pytest.mark.parametrize(
+    "name, address",
+    [
+        # Different street direction
+        ("Subway", "123 W Main St, Mesa, AZ 85201"),
+        ("Corner Cafe", "55 S 1st Ave, Mesa, AZ 85201"),
+        # Different street suffix
+        ("Corner Cafe", "55 N 1st St, Mesa, AZ 85201"),
+        # Different street name
+        ("Subway", "123 E Elm St, Mesa, AZ 85201"),
+        # Different city
+        ("Starbucks", "123 Main St, Boston"),
+        # Similar-sounding but different name
+        ("Mitch Music", "50 Elm St, Auburn, AL 36830"),
+    ],
+)
+def test_does_not_resolve_different_places(resolver, name, address):
+    assert resolver.resolve(name, address) is None
+
+
+@pytest.mark.parametrize(
+    "address, expected",
+    [
+        ("55 N 1st Ave", {"direction": "north", "street": "1st", "suffix": "avenue"}),
+        ("123 Main St NW, Mesa", {"direction": "northwest", "street": "main", "suffix": "street"}),
+        ("100 North St", {"street": "north", "suffix": "street"}),
+        ("5 N Court St", {"direction": "north", "street": "court", "suffix": "street"}),
+    ],
+)
+def test_parse_street(address, expected):
+    assert parse_street(address) == expected